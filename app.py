@@ -1,16 +1,38 @@
 import os
-from flask import Flask, jsonify, render_template, request, redirect, url_for, flash
+from flask import Flask, Response, jsonify, render_template, request, redirect, url_for, flash
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm.exc import StaleDataError
 from datetime import datetime
 
 # Import the Blueprint containing the CRUD API routes
 from product_routes import product_api
+from job_routes import job_api
+from cache import product_cache
+from pagination import parse_limit, parse_sort, search_filter, offset_page, estimated_count
+from search import register_search_ddl
+from stats import register_stats_ddl
+from db_metrics import TimedQueuePool, db_metrics
+from metrics import registry
+from profiling import request_profiler
+from serialization import FastJSONProvider, product_columns, row_to_dict
+from jobs import job_queue
 
 # --- Configuration ---
 app = Flask(__name__)
+# orjson-backed JSON encoding when installed, stdlib otherwise (see serialization.py)
+app.json = FastJSONProvider(app)
 # Set a secret key for session management (required for flash messages)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_SECRET_KEY', 'a_secret_key_for_flash')
 app.url_map.strict_slashes = False 
+# Rows written per statement by the /api/products/bulk endpoints
+app.config['BULK_CHUNK_SIZE'] = int(os.environ.get('BULK_CHUNK_SIZE', 1000))
+
+# Read-through cache for product reads (see cache.py). The default backend is
+# per-process; set CACHE_BACKEND to a shared CacheBackend to share across workers.
+app.config['CACHE_ENABLED'] = os.environ.get('CACHE_ENABLED', 'true').lower() in ('true', '1')
+app.config['CACHE_MAX_ENTRIES'] = int(os.environ.get('CACHE_MAX_ENTRIES', 1024))
+app.config['CACHE_TTL'] = int(os.environ.get('CACHE_TTL', 300))
+product_cache.init_app(app)
 
 # Database credentials (These must match your current Render PostgreSQL credentials)
 DB_HOST = os.environ.get('DB_HOST', 'dpg-d3ic7qje5dus7390s4gg-a')
@@ -19,14 +41,63 @@ DB_USER = os.environ.get('DB_USER', 'product_db_k4v2_user')
 DB_PASS = os.environ.get('DB_PASS', 'RT2RIIydmEMUrdzAgvOsF3YNH2rwpCfr')
 
 # --- SQLALCHEMY SETUP (Connects to DB) ---
-# Construct the single connection string (URI)
-DATABASE_URI = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}/{DB_NAME}"
+# Construct the single connection string (URI). DATABASE_URL, when set, overrides
+# the DB_* settings (e.g. a local sqlite:///bench.db for benchmarks).
+DATABASE_URI = os.environ.get('DATABASE_URL') or f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}/{DB_NAME}"
+if DATABASE_URI.startswith('postgres://'):
+    DATABASE_URI = 'postgresql://' + DATABASE_URI[len('postgres://'):]
 app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URI
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Connection pool and statement limits (per gunicorn worker process)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'poolclass': TimedQueuePool,
+    'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+    'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+    'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+    'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+    'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ('true', '1'),
+}
+if DATABASE_URI.startswith('postgresql'):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS']['connect_args'] = {
+        'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 10)),
+        'options': f"-c statement_timeout={int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))}",
+    }
+# Statements slower than this are logged and counted in /metrics
+app.config['DB_SLOW_QUERY_MS'] = int(os.environ.get('DB_SLOW_QUERY_MS', 500))
+
 # Initialize the 'db' object
 db = SQLAlchemy(app) 
 
+# Query count/time per request, pool wait time and slow-query logging (see db_metrics.py)
+with app.app_context():
+    db_metrics.init_app(app, db.engine)
+
+# Per-endpoint latency/size metrics and sampled cProfile captures (see profiling.py).
+# PROFILE_SAMPLE_RATE is a fraction of requests (0 disables sampling); requests
+# sending 'X-Profile: <PROFILE_TOKEN>' are always profiled.
+app.config['REQUEST_METRICS_ENABLED'] = os.environ.get('REQUEST_METRICS_ENABLED', 'true').lower() in ('true', '1')
+app.config['PROFILE_SAMPLE_RATE'] = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+app.config['PROFILE_TOKEN'] = os.environ.get('PROFILE_TOKEN')
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR')
+if app.config['REQUEST_METRICS_ENABLED']:
+    request_profiler.init_app(app)
+
+# Default stock level at or below which /api/products/stats lists a product
+app.config['LOW_STOCK_THRESHOLD'] = int(os.environ.get('LOW_STOCK_THRESHOLD', 5))
+
+# Background jobs (see jobs.py). Run workers with `flask --app cli jobs work`, or set
+# JOBS_EMBEDDED_WORKERS to run that many worker threads inside each web process.
+app.config['JOBS_EMBEDDED_WORKERS'] = int(os.environ.get('JOBS_EMBEDDED_WORKERS', 0))
+app.config['JOBS_POLL_INTERVAL'] = float(os.environ.get('JOBS_POLL_INTERVAL', 1.0))
+app.config['JOBS_STALE_AFTER'] = int(os.environ.get('JOBS_STALE_AFTER', 600))
+# Export jobs write their files to JOBS_OUTPUT_DIR and /api/jobs/<id>/download serves
+# them from it, so with a separate worker process it must be shared storage. Import
+# uploads are kept in the database (job_upload) and need no shared disk.
+if os.environ.get('JOBS_OUTPUT_DIR'):
+    app.config['JOBS_OUTPUT_DIR'] = os.environ['JOBS_OUTPUT_DIR']
+job_queue.init_app(app)
+
 # --- Entity Model: Product ---
 class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -36,6 +107,24 @@ class Product(db.Model):
     stock_quantity = db.Column(db.Integer, default=0) 
     is_available = db.Column(db.Boolean, default=True) 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Optimistic concurrency: the ORM adds 'AND version = <read version>' to every
+    # UPDATE/DELETE and bumps it, raising StaleDataError if another writer got there first.
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    # Composite (sort column, id) indexes back the keyset pagination in
+    # pagination.py; every sortable column is paired with the primary key.
+    __table_args__ = (
+        db.Index('ix_product_created_at_id', 'created_at', 'id'),
+        db.Index('ix_product_price_id', 'price', 'id'),
+        db.Index('ix_product_stock_quantity_id', 'stock_quantity', 'id'),
+        db.Index('ix_product_name_id', 'name', 'id'),
+        # name_prefix filters (LIKE 'abc%') need pattern_ops on PostgreSQL outside
+        # the C collation; that opclass cannot serve ORDER BY name, hence two indexes
+        db.Index('ix_product_name_pattern', 'name',
+                 postgresql_ops={'name': 'varchar_pattern_ops'}).ddl_if(dialect='postgresql'),
+        db.Index('ix_product_is_available_id', 'is_available', 'id'),
+    )
+    __mapper_args__ = {'version_id_col': version}
 
     def to_dict(self):
         """Converts the SQLAlchemy model instance to a JSON serializable dictionary."""
@@ -46,9 +135,86 @@ class Product(db.Model):
             'price': f"{self.price:.2f}",
             'stock_quantity': self.stock_quantity,
             'is_available': self.is_available,
-            'created_at': self.created_at.isoformat()
+            'created_at': self.created_at.isoformat(),
+            'version': self.version
+        }
+
+    @property
+    def etag(self):
+        """Strong ETag identifying this product at its current version (used with If-Match)."""
+        return f"product-{self.id}-v{self.version}"
+
+# PostgreSQL full-text search column and indexes (see search.py)
+register_search_ddl(Product.__table__)
+
+# --- Entity Model: ProductStats (running inventory totals, see stats.py) ---
+class ProductStats(db.Model):
+    __tablename__ = 'product_stats'
+    # Maintained only by the triggers on product; /api/products/stats sums the slots
+    slot = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    product_count = db.Column(db.BigInteger, nullable=False, default=0)
+    available_count = db.Column(db.BigInteger, nullable=False, default=0)
+    total_stock = db.Column(db.BigInteger, nullable=False, default=0)
+    stock_value = db.Column(db.Numeric(20, 4, asdecimal=False), nullable=False, default=0)
+    # Write counter and epoch time of the latest write; summed/maxed they version the catalog
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    modified_at = db.Column(db.Float, nullable=True)
+
+register_stats_ddl(db.metadata, ProductStats.__table__, Product.__table__)
+
+# --- Entity Model: Job (background work queue, see jobs.py) ---
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    type = db.Column(db.String(50), nullable=False)
+    # queued -> running -> succeeded | failed
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    result = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    progress_current = db.Column(db.Integer, nullable=False, default=0)
+    progress_total = db.Column(db.Integer, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    worker = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    # Touched on every progress update; running jobs that stop heartbeating are requeued
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    # Resume point committed with each chunk of work, so a requeued job continues from it
+    checkpoint = db.Column(db.JSON, nullable=True)
+
+    # Workers claim the oldest queued job, so (status, id) serves the claim query
+    __table_args__ = (
+        db.Index('ix_job_status_id', 'status', 'id'),
+    )
+
+    def to_dict(self):
+        """Converts the job to a JSON serializable dictionary."""
+        percent = None
+        if self.progress_total:
+            percent = round(100.0 * self.progress_current / self.progress_total, 1)
+        return {
+            'id': self.id,
+            'type': self.type,
+            'status': self.status,
+            'payload': self.payload,
+            'result': self.result,
+            'error': self.error,
+            'progress': {'current': self.progress_current, 'total': self.progress_total, 'percent': percent},
+            'attempts': self.attempts,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
         }
 
+# --- Entity Model: JobUpload (files uploaded for import jobs, see jobs.py) ---
+class JobUpload(db.Model):
+    __tablename__ = 'job_upload'
+    # One row per UPLOAD_CHUNK_SIZE block of the file, read back in seq order
+    upload_id = db.Column(db.String(32), primary_key=True)
+    seq = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+
 # --- Utility Functions for Form Submission ---
 def safe_convert(value, target_type, default):
     """Safely converts a string value to a number type, using default if value is empty/None."""
@@ -117,18 +283,49 @@ def submit_product():
         return redirect(url_for('create_product_form'))
 
 # --- NEW ROUTE: Product List Table (Read UI) ---
+UI_PAGE_SIZE = 25
+UI_MAX_PAGE_SIZE = 200
+
+def load_product_page(page, size, sort_key, descending, search):
+    """Fetches one page of products (as dicts) plus paging info for the HTML table."""
+    query = db.session.query(*product_columns(Product))
+    if search:
+        query = query.filter(search_filter(Product, search))
+    rows, has_next = offset_page(query, Product, sort_key, descending, page, size)
+    return {
+        'products': [row_to_dict(row) for row in rows],
+        'has_next': has_next,
+        # The planner estimate is only meaningful for the unfiltered table
+        'estimated_total': None if search else estimated_count(db, Product),
+    }
+
 @app.route('/products', methods=['GET'])
 def list_products_ui():
-    """Fetches all products and renders them in an HTML table."""
+    """Renders one page of products in an HTML table, with sorting and search."""
+    args = request.args
     try:
-        products = Product.query.all()
-        # Convert models to dictionaries for rendering in Jinja2
-        product_list = [p.to_dict() for p in products]
-        
-        return render_template('product_list.html', products=product_list)
+        page = max(safe_convert(args.get('page'), int, 1), 1)
+        size = parse_limit(args.get('size'), default=UI_PAGE_SIZE, maximum=UI_MAX_PAGE_SIZE)
+        sort_key, descending = parse_sort(args.get('sort'), args.get('order'))
+    except ValueError as e:
+        flash(f"Error: Invalid list parameters. {e}")
+        page, size, sort_key, descending = 1, UI_PAGE_SIZE, 'id', False
+    search = args.get('q', '').strip()
+
+    # Query parameters reused by the pagination and sort links in the template
+    params = {'q': search, 'sort': sort_key, 'order': 'desc' if descending else 'asc', 'size': size}
+    # Page changes fetch only the table fragment (see product_list.html)
+    template = '_product_table.html' if args.get('partial') else 'product_list.html'
+    try:
+        # Cached until the next write
+        listing = product_cache.cached(
+            f"ui:products:{page}:{size}:{sort_key}:{descending}:{search}",
+            lambda: load_product_page(page, size, sort_key, descending, search))
     except Exception as e:
         flash(f"Error fetching products: {e}")
-        return render_template('product_list.html', products=[])
+        listing = {'products': [], 'has_next': False, 'estimated_total': None}
+
+    return render_template(template, page=page, params=params, **listing)
 
 # --- NEW ROUTE: Delete Product (Delete UI) ---
 @app.route('/delete/<int:product_id>', methods=['POST'])
@@ -175,11 +372,16 @@ def update_product_ui(product_id):
         # Checkbox is 'on' if checked, or None if unchecked.
         is_available_val = True if form_data.get('is_available') == 'on' else False
         
+        # Version the form was rendered from (hidden field); None for old forms
+        version_val = safe_convert(form_data.get('version'), int, None)
+        
         # 2. Basic Validation
         if not name_val:
             raise ValueError("Product Name is required.")
         if price_val < 0 or stock_quantity_val < 0:
             raise ValueError("Price and Stock Quantity cannot be negative.")
+        if version_val is not None and version_val != product.version:
+            raise StaleDataError("Product changed since the form was opened.")
 
         # 3. Update Product Fields
         product.name = name_val
@@ -202,6 +404,12 @@ def update_product_ui(product_id):
         # A more robust solution would be to render_template directly here and pass the form_data back
         return redirect(url_for('edit_product_form', product_id=product_id))
 
+    except StaleDataError:
+        # Someone else saved this product first; show them the current values
+        db.session.rollback()
+        flash("Error: This product was changed by someone else while you were editing. Review the current values and save again.")
+        return redirect(url_for('edit_product_form', product_id=product_id))
+
     except Exception as e:
         db.session.rollback()
         flash(f"Fatal Error: Failed to update product. Database error: {e.__class__.__name__}.")
@@ -214,13 +422,22 @@ def hello_world_status():
     """Returns a simple status message at the /status URL."""
     return jsonify({
         "message": "Hello World! Application is running.",
-        "status": "Database connection verified during startup. API available at /api/products"
+        "status": "Database connection verified during startup. API available at /api/products",
+        "pool": db.engine.pool.status()
     }), 200
 
 
+# --- Metrics Route (Prometheus text format) ---
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Exposes this worker's query, pool and request metrics for Prometheus."""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
 # --- Blueprint Registration ---
 # This registers the CRUD API routes under the prefix '/api'
 app.register_blueprint(product_api, url_prefix='/api')
+app.register_blueprint(job_api, url_prefix='/api')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,274 @@
+# benchmarks/bench.py
+"""
+Throughput/latency benchmark for every API and UI route.
+
+Starts the app in-process against a local database (SQLite by default),
+seeds N products, drives each route through Flask's test client and writes
+the results as JSON. With --baseline the run is compared to a stored result
+and the exit status is 1 when any route's p50 latency regressed beyond
+--threshold.
+
+    python benchmarks/bench.py --products 100000 --output bench.json
+    python benchmarks/bench.py --save-baseline benchmarks/baseline.json
+    python benchmarks/bench.py --baseline benchmarks/baseline.json --threshold 0.2
+
+Point --database at a local PostgreSQL URL to benchmark the production engine.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORDS = ('blue', 'red', 'steel', 'cotton', 'widget', 'gadget', 'lamp', 'chair', 'cable',
+         'adapter', 'pro', 'mini', 'deluxe', 'basic', 'kit', 'pack', 'bolt', 'screw')
+SEED_CHUNK = 10000
+
+
+# --- App Setup ---
+def load_app(database_url, cache):
+    """Imports the app configured for the benchmark database."""
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['CACHE_ENABLED'] = 'true' if cache else 'false'
+    sys.path.insert(0, ROOT)
+    import app as app_module
+    return app_module
+
+
+def seed(app_module, count, rng):
+    """Recreates the tables and inserts 'count' generated products."""
+    app, db, Product = app_module.app, app_module.db, app_module.Product
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        for start in range(0, count, SEED_CHUNK):
+            rows = []
+            for _ in range(start, min(start + SEED_CHUNK, count)):
+                name = ' '.join(rng.sample(WORDS, 3))
+                rows.append({
+                    'name': name.title(),
+                    'description': f"{name} {' '.join(rng.sample(WORDS, 4))}",
+                    'price': round(rng.uniform(0.5, 500), 2),
+                    'stock_quantity': rng.randint(0, 1000),
+                    'is_available': rng.random() < 0.8,
+                    'created_at': datetime(2024, 1, 1) + (datetime(2025, 1, 1) - datetime(2024, 1, 1)) * rng.random(),
+                })
+            db.session.execute(db.insert(Product), rows)
+            db.session.commit()
+
+
+# --- Scenarios ---
+def scenarios(count, rng):
+    """
+    Returns (name, method, build, expected_status) tuples. 'build(i)' returns
+    the path and test-client keyword arguments for the i-th request.
+    """
+    # Reads and updates use the lower half of the seeded ids; deletes consume
+    # distinct ids from the top, so no request targets a deleted row.
+    def any_id(i):
+        return rng.randint(1, max(count // 2, 1))
+
+    delete_api_ids = iter(range(count, 0, -2))
+    delete_ui_ids = iter(range(count - 1, 0, -2))
+
+    return [
+        ('api_list', 'GET', lambda i: ('/api/products', {}), 200),
+        ('api_list_filtered', 'GET', lambda i: (
+            '/api/products?is_available=true&min_price=10&max_price=200&sort=price&order=desc&limit=50', {}), 200),
+        ('api_list_name_prefix', 'GET', lambda i: (f'/api/products?name_prefix={rng.choice(WORDS).title()}', {}), 200),
+        ('api_get', 'GET', lambda i: (f'/api/products/{any_id(i)}', {}), 200),
+        ('api_search', 'GET', lambda i: (f'/api/products/search?q={rng.choice(WORDS)}', {}), 200),
+        ('api_stats', 'GET', lambda i: ('/api/products/stats', {}), 200),
+        ('api_export_ndjson', 'GET', lambda i: ('/api/products/export?format=ndjson&max_stock=10', {}), 200),
+        ('api_create', 'POST', lambda i: ('/api/products', {'json': {
+            'name': f'bench {i}', 'price': 9.99, 'stock_quantity': 5}}), 201),
+        ('api_update', 'PUT', lambda i: (f'/api/products/{any_id(i)}', {'json': {
+            'price': round(rng.uniform(1, 100), 2), 'stock_quantity': rng.randint(0, 100)}}), 200),
+        ('api_stock_adjust', 'POST', lambda i: (f'/api/products/{any_id(i)}/stock', {'json': {
+            'delta': 1}}), 200),
+        ('api_bulk_create_100', 'POST', lambda i: ('/api/products/bulk', {'json': [
+            {'name': f'bulk {i}-{n}', 'price': 1.5, 'stock_quantity': n} for n in range(100)]}), 201),
+        ('api_delete', 'DELETE', lambda i: (f'/api/products/{next(delete_api_ids)}', {}), 204),
+        ('ui_list', 'GET', lambda i: ('/products', {}), 200),
+        ('ui_list_page_sorted', 'GET', lambda i: (f'/products?page={rng.randint(1, 20)}&sort=price&order=desc', {}), 200),
+        ('ui_list_search', 'GET', lambda i: (f'/products?q={rng.choice(WORDS)}', {}), 200),
+        ('ui_create_form', 'GET', lambda i: ('/', {}), 200),
+        ('ui_form_submit', 'POST', lambda i: ('/', {'data': {
+            'name': f'form {i}', 'description': 'bench', 'price': '4.50', 'stock_quantity': '3',
+            'is_available': 'on'}}), 302),
+        ('ui_edit_form', 'GET', lambda i: (f'/edit/{any_id(i)}', {}), 200),
+        ('ui_edit_submit', 'POST', lambda i: (f'/edit/{any_id(i)}', {'data': {
+            'name': f'edited {i}', 'price': '7.25', 'stock_quantity': '8'}}), 302),
+        ('ui_delete', 'POST', lambda i: (f'/delete/{next(delete_ui_ids)}', {}), 302),
+        ('status', 'GET', lambda i: ('/status', {}), 200),
+    ]
+
+
+def percentile(sorted_values, fraction):
+    index = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def run_scenario(app, scenario, requests, warmup, concurrency):
+    """Runs one scenario and returns its latency/throughput summary (milliseconds)."""
+    name, method, build, expected = scenario
+    lock = threading.Lock()
+    counter = iter(range(warmup, warmup + requests))
+    latencies = []
+    failures = []
+
+    def send(client, i):
+        path, kwargs = build(i)
+        start = time.perf_counter()
+        response = client.open(path, method=method, **kwargs)
+        response.get_data()
+        response.close()
+        elapsed = time.perf_counter() - start
+        if response.status_code != expected:
+            return None, f'{method} {path} -> {response.status_code}'
+        return elapsed, None
+
+    def worker():
+        # No cookie jar: redirects would otherwise pile flash messages into the session
+        client = app.test_client(use_cookies=False)
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            elapsed, failure = send(client, i)
+            with lock:
+                if failure:
+                    failures.append(failure)
+                else:
+                    latencies.append(elapsed)
+
+    warmup_client = app.test_client(use_cookies=False)
+    for i in range(warmup):
+        send(warmup_client, i)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    if not latencies:
+        return {'error': failures[0] if failures else 'no requests completed'}
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'failures': len(failures),
+        'throughput_rps': round(len(latencies) / wall, 1),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3),
+    }
+
+
+# --- Baseline Comparison ---
+def compare(results, baseline, threshold):
+    """Returns (report_lines, regressed) comparing p50 latency per scenario."""
+    lines = []
+    regressed = False
+    for name, current in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous or 'p50_ms' not in previous or 'p50_ms' not in current:
+            lines.append(f'{name:<24} (no baseline)')
+            continue
+        ratio = current['p50_ms'] / previous['p50_ms'] if previous['p50_ms'] else 1.0
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  REGRESSION'
+            regressed = True
+        elif ratio < 1 - threshold:
+            flag = '  improved'
+        lines.append(f"{name:<24} p50 {previous['p50_ms']:>9.3f} -> {current['p50_ms']:>9.3f} ms "
+                     f"({(ratio - 1) * 100:+.1f}%){flag}")
+    return lines, regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=10000, help='rows to seed (default 10000)')
+    parser.add_argument('--requests', type=int, default=200, help='measured requests per route (default 200)')
+    parser.add_argument('--warmup', type=int, default=10, help='unmeasured requests per route (default 10)')
+    parser.add_argument('--concurrency', type=int, default=1, help='client threads per route (default 1)')
+    parser.add_argument('--database', help='database URL (default: a temporary SQLite file)')
+    parser.add_argument('--cache', action='store_true', help='leave the read cache enabled')
+    parser.add_argument('--only', help='comma-separated scenario names to run')
+    parser.add_argument('--seed', type=int, default=42, help='random seed for data and requests')
+    parser.add_argument('--output', help='write results JSON to this file (default: stdout)')
+    parser.add_argument('--baseline', help='compare against this results JSON')
+    parser.add_argument('--save-baseline', help='also write the results to this baseline file')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed p50 slowdown before failing, as a fraction (default 0.2)')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as workdir:
+        database_url = args.database or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        app_module = load_app(database_url, args.cache)
+        app_module.app.config['SECRET_KEY'] = 'bench'
+
+        print(f'Seeding {args.products} products into {database_url} ...', file=sys.stderr)
+        started = time.perf_counter()
+        seed(app_module, args.products, rng)
+        seed_seconds = time.perf_counter() - started
+
+        selected = set(args.only.split(',')) if args.only else None
+        results = {}
+        for scenario in scenarios(args.products, rng):
+            if selected and scenario[0] not in selected:
+                continue
+            results[scenario[0]] = run_scenario(
+                app_module.app, scenario, args.requests, args.warmup, args.concurrency)
+            print(f'{scenario[0]:<24} {results[scenario[0]]}', file=sys.stderr)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'products': args.products,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'database': database_url.split(':', 1)[0],
+            'cache': args.cache,
+            'seed_seconds': round(seed_seconds, 2),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+    encoded = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(encoded + '\n')
+    else:
+        print(encoded)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            f.write(encoded + '\n')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        lines, regressed = compare(results, baseline, args.threshold)
+        print('\n'.join(lines), file=sys.stderr)
+        return 1 if regressed else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
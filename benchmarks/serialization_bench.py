@@ -0,0 +1,99 @@
+# benchmarks/serialization_bench.py
+"""
+Compares product-list serialization paths on 10k/100k-row lists:
+
+  orm_to_dict_stdlib   Product.query + Product.to_dict() + Flask's default JSON provider
+  columns_stdlib       column-tuple SELECT + row_to_dict() + FastJSONProvider (stdlib backend)
+  columns_fast         column-tuple SELECT + row_to_dict() + FastJSONProvider (orjson if installed)
+
+Each path is timed end to end (query, row conversion, encoding) inside an
+application context.
+
+    python benchmarks/serialization_bench.py --rows 10000,100000 --output serialization.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from flask.json.provider import DefaultJSONProvider
+
+from bench import load_app, seed
+
+
+def time_path(repeat, fn):
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = len(fn())
+        timings.append(time.perf_counter() - start)
+    return {'best_ms': round(min(timings) * 1000, 2),
+            'median_ms': round(statistics.median(timings) * 1000, 2),
+            'bytes': size}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', default='10000,100000', help='comma-separated list sizes')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per path (default 5)')
+    parser.add_argument('--output', help='write results JSON to this file (default: stdout)')
+    args = parser.parse_args(argv)
+    sizes = [int(size) for size in args.rows.split(',')]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app_module = load_app(f"sqlite:///{os.path.join(workdir, 'serialization.db')}", cache=False)
+        app, db, Product = app_module.app, app_module.db, app_module.Product
+        import serialization
+        from serialization import FastJSONProvider, product_columns, row_to_dict
+
+        default_provider = DefaultJSONProvider(app)
+        fast_provider = FastJSONProvider(app)
+        orjson_module = serialization.orjson
+
+        seed(app_module, max(sizes), random.Random(42))
+        results = {'orjson_available': orjson_module is not None, 'sizes': {}}
+        with app.app_context():
+            for size in sizes:
+                def orm_path():
+                    db.session.expunge_all()
+                    products = Product.query.order_by(Product.id).limit(size).all()
+                    return default_provider.dumps([product.to_dict() for product in products])
+
+                def columns_path():
+                    rows = db.session.execute(
+                        db.select(*product_columns(Product)).order_by(Product.id).limit(size)).all()
+                    return fast_provider.dumps([row_to_dict(row) for row in rows])
+
+                def columns_stdlib_path():
+                    serialization.orjson = None
+                    try:
+                        return columns_path()
+                    finally:
+                        serialization.orjson = orjson_module
+
+                results['sizes'][size] = {
+                    'orm_to_dict_stdlib': time_path(args.repeat, orm_path),
+                    'columns_stdlib': time_path(args.repeat, columns_stdlib_path),
+                    'columns_fast': time_path(args.repeat, columns_path),
+                }
+                baseline = results['sizes'][size]['orm_to_dict_stdlib']['median_ms']
+                for name, timing in results['sizes'][size].items():
+                    timing['speedup'] = round(baseline / timing['median_ms'], 2) if timing['median_ms'] else None
+                print(f'{size:>8} rows: {results["sizes"][size]}', file=sys.stderr)
+
+    encoded = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(encoded + '\n')
+    else:
+        print(encoded)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
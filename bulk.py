@@ -0,0 +1,191 @@
+# bulk.py
+# Batch create/update/delete helpers for the /api/products/bulk endpoints.
+#
+# Items are validated up front with the same rules as the single-row routes;
+# writes are then issued as executemany statements in chunks of
+# BULK_CHUNK_SIZE rows, all inside the request's single transaction.
+from sqlalchemy import bindparam, delete, insert, text, update
+from sqlalchemy.orm.exc import StaleDataError
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Fields a client may set on a product, and their defaults on create.
+PRODUCT_FIELDS = ('name', 'description', 'price', 'stock_quantity', 'is_available')
+CREATE_DEFAULTS = {'description': None, 'price': 0.00, 'stock_quantity': 0, 'is_available': True}
+# validate_product_input skips None, but these columns must never be set to NULL
+NON_NULL_FIELDS = ('name', 'price', 'stock_quantity', 'is_available')
+
+
+def null_fields(data):
+    """Returns the NON_NULL_FIELDS that 'data' explicitly sets to None."""
+    return [field for field in NON_NULL_FIELDS if field in data and data[field] is None]
+
+
+def chunked(items, size):
+    """Yields successive slices of 'items' holding at most 'size' elements."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def product_values(data, partial=False):
+    """
+    Converts a validated item into column values.
+    With partial=True only the fields present in 'data' are returned.
+    """
+    values = {} if partial else dict(CREATE_DEFAULTS)
+    for field in PRODUCT_FIELDS:
+        if field in data:
+            values[field] = data[field]
+    if values.get('price') is not None:
+        values['price'] = float(values['price'])
+    if values.get('stock_quantity') is not None:
+        values['stock_quantity'] = int(values['stock_quantity'])
+    return values
+
+
+def validate_items(items, validate, require_name=False, require_id=False):
+    """
+    Runs 'validate' (validate_product_input) over every item.
+    Returns a list of {"index", "error"} dicts, empty when all items are valid.
+    """
+    if not isinstance(items, list) or not items:
+        return [{"index": None, "error": "Request body must be a non-empty JSON array."}]
+
+    errors = []
+    seen_ids = set()
+    for index, data in enumerate(items):
+        if not isinstance(data, dict):
+            errors.append({"index": index, "error": "Each item must be a JSON object."})
+            continue
+        if require_name and 'name' not in data:
+            errors.append({"index": index, "error": "Name field is required."})
+            continue
+        if require_id or 'id' in data:
+            product_id = data.get('id')
+            if not isinstance(product_id, int) or isinstance(product_id, bool):
+                errors.append({"index": index, "error": "id must be an integer."})
+                continue
+            if product_id in seen_ids:
+                errors.append({"index": index, "error": f"Duplicate id {product_id}."})
+                continue
+            seen_ids.add(product_id)
+        version = data.get('version')
+        if version is not None and (not isinstance(version, int) or isinstance(version, bool)):
+            errors.append({"index": index, "error": "version must be an integer."})
+            continue
+        nulls = null_fields(data)
+        if nulls:
+            errors.append({"index": index, "error": f"{', '.join(nulls)} cannot be null."})
+            continue
+        validation_message, error_code = validate(data)
+        if error_code:
+            errors.append({"index": index, "error": validation_message})
+    return errors
+
+
+def current_versions(db, Product, ids, chunk_size):
+    """Returns {id: version} for the given ids that exist in the product table."""
+    versions = {}
+    for chunk in chunked(ids, chunk_size):
+        versions.update(db.session.execute(
+            db.select(Product.id, Product.version).where(Product.id.in_(chunk))).all())
+    return versions
+
+
+def bulk_insert(db, Product, rows, chunk_size):
+    """Inserts 'rows' with one multi-row INSERT per chunk and returns the new ids."""
+    new_ids = []
+    for chunk in chunked(rows, chunk_size):
+        # Ids come back in row order, so callers can match them to their items
+        new_ids.extend(db.session.scalars(
+            insert(Product).returning(Product.id, sort_by_parameter_order=True), chunk))
+    return new_ids
+
+
+def bulk_upsert(db, Product, rows, chunk_size):
+    """
+    Inserts or updates 'rows' (each carrying an id) with INSERT ... ON CONFLICT (id)
+    DO UPDATE and returns the ids in row order. Only the fields a row carries
+    are written to an existing product (like a PATCH); a new product gets
+    CREATE_DEFAULTS for the rest. Supported on PostgreSQL and SQLite.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        raise ValueError(f"Upsert is not supported on the '{dialect}' database.")
+
+    # One statement per distinct set of fields, as in bulk_update
+    groups = {}
+    for position, row in enumerate(rows):
+        groups.setdefault(frozenset(row), []).append(position)
+
+    upserted_ids = [None] * len(rows)
+    for fields, positions in groups.items():
+        statement = dialect_insert(Product)
+        statement = statement.on_conflict_do_update(
+            index_elements=[Product.id],
+            set_=dict({field: statement.excluded[field] for field in PRODUCT_FIELDS if field in fields},
+                      version=Product.version + 1),
+        ).returning(Product.id, sort_by_parameter_order=True)
+        for chunk in chunked(positions, chunk_size):
+            ids = db.session.scalars(statement, [dict(CREATE_DEFAULTS, **rows[position]) for position in chunk])
+            for position, product_id in zip(chunk, ids):
+                upserted_ids[position] = product_id
+
+    if dialect == 'postgresql':
+        # Explicit ids bypass the serial sequence; move it past them so later
+        # plain INSERTs do not collide.
+        table = Product.__table__.name
+        db.session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"GREATEST((SELECT MAX(id) FROM {table}), 1))"
+        ))
+    return upserted_ids
+
+
+def bulk_update(db, Product, rows, chunk_size):
+    """
+    Applies partial updates keyed by 'id' as executemany UPDATEs, one statement
+    per distinct set of fields, bumping each row's version. Rows carrying a
+    'version' only match that version; if any row is not updated a
+    StaleDataError is raised so the caller can roll the batch back.
+    """
+    table = Product.__table__
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+
+    sane_rowcount = db.session.get_bind().dialect.supports_sane_multi_rowcount
+    for keys, group in groups.items():
+        fields = [key for key in keys if key not in ('id', 'version')]
+        criteria = [table.c.id == bindparam('b_id')]
+        if 'version' in keys:
+            criteria.append(table.c.version == bindparam('b_version'))
+        statement = (
+            update(table)
+            .where(*criteria)
+            .values(dict({field: bindparam(field) for field in fields}, version=table.c.version + 1))
+        )
+        for chunk in chunked(group, chunk_size):
+            params = [dict({field: row[field] for field in fields},
+                           b_id=row['id'], **({'b_version': row['version']} if 'version' in row else {}))
+                      for row in chunk]
+            result = db.session.connection().execute(statement, params)
+            if sane_rowcount and result.rowcount != len(params):
+                raise StaleDataError(
+                    f"Expected to update {len(params)} products but updated {result.rowcount}.")
+
+
+def bulk_delete(db, Product, ids, chunk_size):
+    """Deletes the given ids with one DELETE ... WHERE id IN (...) per chunk."""
+    deleted = 0
+    for chunk in chunked(ids, chunk_size):
+        result = db.session.execute(
+            delete(Product).where(Product.id.in_(chunk)),
+            execution_options={'synchronize_session': False},
+        )
+        deleted += result.rowcount
+    return deleted
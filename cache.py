@@ -0,0 +1,169 @@
+# cache.py
+# Read-through cache for product reads, keyed by the catalog version.
+#
+# The catalog version lives in the database (product_stats, bumped by triggers
+# on every write to product, see stats.py), so writes from any web worker, job
+# worker, CLI import or manual SQL change it. Cache keys and ETags embed that
+# version, so nothing needs invalidating and stale entries simply age out of
+# the LRU. Backends are pluggable: LocalCacheBackend is per-process, and a
+# backend shared by all gunicorn workers (e.g. Redis) only needs to implement
+# CacheBackend.
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from flask import Response, request
+
+from stats import catalog_version
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL = 300
+
+
+# --- Backends ---
+class CacheBackend:
+    """Interface for cache storage. Values are arbitrary Python objects."""
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        """Stores 'value'; ttl=None uses the backend default and ttl=0 never expires."""
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class LocalCacheBackend(CacheBackend):
+    """Thread-safe in-process LRU cache with a per-entry TTL and a size bound."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, default_ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# --- Product Cache ---
+class ProductCache:
+    """Caches serialized product reads and derives ETag/Last-Modified from the catalog version."""
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.enabled = True
+
+    def init_app(self, app):
+        self.enabled = app.config.get('CACHE_ENABLED', True)
+        self.backend = app.config.get('CACHE_BACKEND') or LocalCacheBackend(
+            max_entries=app.config.get('CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES),
+            default_ttl=app.config.get('CACHE_TTL', DEFAULT_TTL),
+        )
+
+    def catalog_version(self):
+        """
+        Returns (version_token, last_modified_timestamp) read from the database,
+        or None if the database cannot track catalog changes.
+        """
+        from app import db, ProductStats
+        version = catalog_version(db, ProductStats)
+        if version is None:
+            return None
+        count, modified = version
+        # The timestamp keeps a rebuilt database from reissuing an ETag a client holds
+        return f'{count}-{int(modified * 1000)}', modified
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        return self.backend.get(key)
+
+    def set(self, key, value):
+        if self.enabled:
+            self.backend.set(key, value)
+
+    def cached(self, key, build):
+        """Returns the value cached for 'key' under the current catalog version, building it on a miss."""
+        version = self.catalog_version()
+        if version is None:
+            return build()
+        versioned_key = f'{version[0]}:{key}'
+        value = self.get(versioned_key)
+        if value is None:
+            value = build()
+            self.set(versioned_key, value)
+        return value
+
+    def json_response(self, build):
+        """
+        Serves the current request from cache, or calls 'build' to produce a
+        (body, status) or (body, status, etag) tuple and caches it when the
+        status is 200. Without an explicit etag the catalog version is used.
+        Adds ETag/Last-Modified and answers conditional requests with 304.
+        """
+        version = self.catalog_version()
+        if version is None:
+            # Nothing to validate against: build every time, without validators
+            result = build()
+            return Response(result[0], status=result[1], mimetype='application/json')
+        token, modified = version
+        etag = f'catalog-{token}'
+        last_modified = datetime.fromtimestamp(modified, tz=timezone.utc)
+
+        if self.enabled and request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            key = f'{token}:{request.full_path}'
+            cached = self.get(key)
+            if cached is None:
+                result = build()
+                body, status = result[0], result[1]
+                if len(result) > 2:
+                    etag = result[2]
+                if status == 200:
+                    self.set(key, (body, etag))
+            else:
+                (body, etag), status = cached, 200
+            response = Response(body, status=status, mimetype='application/json')
+
+        if response.status_code in (200, 304):
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            response.make_conditional(request)
+        return response
+
+
+product_cache = ProductCache()
@@ -1,10 +1,16 @@
 # cli.py
+import json
+
 import click
-from app import app, db # Import necessary objects from the main app
+from app import app, db, Product, ProductStats, Job # Import necessary objects from the main app
+from search import install_search
+from stats import install_stats_ddl, refresh_stats
+from jobs import JOB_STATUSES, JobWorker, enqueue
+from product_import import IMPORT_CHUNK_SIZE, IMPORT_FORMATS, import_format, import_products
 
 # Create a custom command group for database tasks
 # This will be available as 'flask db'
-@app.cli.group()
+@app.cli.group('db')
 def db_commands():
     """Database administration commands."""
     pass
@@ -18,4 +24,175 @@ def create_db():
             db.create_all()
             click.echo("✅ Database tables created successfully.")
         except Exception as e:
-            click.echo(f"❌ ERROR: Failed to create database tables. Error: {e}")
\ No newline at end of file
+            click.echo(f"❌ ERROR: Failed to create database tables. Error: {e}")
+
+@db_commands.command('create-search-index')
+def create_search_index():
+    """Adds the full-text search column and indexes to an existing product table (PostgreSQL)."""
+
+    with app.app_context():
+        try:
+            if install_search(db, Product.__table__):
+                click.echo("✅ Search column and indexes are in place.")
+            else:
+                click.echo("ℹ️ Not a PostgreSQL database; search uses the portable fallback engine.")
+        except Exception as e:
+            db.session.rollback()
+            click.echo(f"❌ ERROR: Failed to create search indexes. Error: {e}")
+
+
+@db_commands.command('upgrade')
+def upgrade_db():
+    """Brings existing tables up to date: new columns, catalog version triggers and indexes."""
+
+    with app.app_context():
+        try:
+            table = Product.__table__.name
+            inspector = db.inspect(db.engine)
+            existing = {column['name'] for column in inspector.get_columns(table)}
+            changes = []
+            if 'version' not in existing:
+                db.session.execute(db.text(
+                    f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+                changes.append("added 'version' column")
+            # The job table predates the resume checkpoints of jobs.py
+            job_table = Job.__table__
+            if (inspector.has_table(job_table.name)
+                    and 'checkpoint' not in {column['name'] for column in inspector.get_columns(job_table.name)}):
+                column_type = job_table.c.checkpoint.type.compile(dialect=db.engine.dialect)
+                db.session.execute(db.text(f"ALTER TABLE {job_table.name} ADD COLUMN checkpoint {column_type}"))
+                changes.append("added job 'checkpoint' column")
+
+            # product_stats carries the catalog version (see stats.py); its triggers
+            # are reinstalled below to maintain it
+            stats_table = ProductStats.__table__
+            stats_outdated = not inspector.has_table(stats_table.name)
+            if not stats_outdated:
+                stats_columns = {column['name'] for column in inspector.get_columns(stats_table.name)}
+                if 'version' not in stats_columns:
+                    db.session.execute(db.text(
+                        f"ALTER TABLE {stats_table.name} ADD COLUMN version BIGINT NOT NULL DEFAULT 0"))
+                    stats_outdated = True
+                if 'modified_at' not in stats_columns:
+                    column_type = stats_table.c.modified_at.type.compile(dialect=db.engine.dialect)
+                    db.session.execute(db.text(
+                        f"ALTER TABLE {stats_table.name} ADD COLUMN modified_at {column_type}"))
+                    stats_outdated = True
+
+            # An earlier ix_product_name_id was built with varchar_pattern_ops, which
+            # cannot serve ORDER BY name; drop it so the plain index is recreated
+            if db.engine.dialect.name == 'postgresql':
+                definition = db.session.execute(db.text(
+                    "SELECT indexdef FROM pg_indexes WHERE indexname = 'ix_product_name_id'")).scalar()
+                if definition and 'pattern_ops' in definition:
+                    db.session.execute(db.text("DROP INDEX ix_product_name_id"))
+                    changes.append("dropped pattern_ops ix_product_name_id")
+            db.session.commit()
+
+            if stats_outdated:
+                stats_table.create(db.engine, checkfirst=True)
+                if install_stats_ddl(db, stats_table, Product.__table__):
+                    changes.append("installed catalog version triggers")
+
+            # create_all skips existing tables, so indexes added to the model later are created here.
+            # Note: CREATE INDEX blocks writes to the table while it builds.
+            before = {index['name'] for index in db.inspect(db.engine).get_indexes(table)}
+            for index in Product.__table__.indexes:
+                if index.name not in before:
+                    # Skipped for indexes limited to another dialect (ddl_if)
+                    index.create(db.engine)
+            after = {index['name'] for index in db.inspect(db.engine).get_indexes(table)}
+            changes += [f"created index {name}" for name in sorted(after - before)]
+
+            if changes:
+                click.echo(f"✅ Database upgraded: {'; '.join(changes)}.")
+            else:
+                click.echo("✅ Database is already up to date.")
+        except Exception as e:
+            db.session.rollback()
+            click.echo(f"❌ ERROR: Failed to upgrade database tables. Error: {e}")
+
+
+@db_commands.command('import-products')
+@click.argument('file', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(IMPORT_FORMATS), default=None,
+              help='File format (default: from the file extension).')
+@click.option('--chunk-size', default=IMPORT_CHUNK_SIZE, show_default=True, help='Rows loaded per transaction.')
+def import_products_command(file, fmt, chunk_size):
+    """Imports products from a CSV or NDJSON file (rows with an id update that product)."""
+
+    def report(summary, checkpoint):
+        click.echo(f"   ... {summary['inserted'] + summary['upserted']} rows loaded, {summary['skipped']} skipped")
+
+    with app.app_context():
+        try:
+            fmt = import_format(file, fmt)
+            # utf-8-sig also accepts files saved with a BOM (e.g. by Excel)
+            with open(file, newline='', encoding='utf-8-sig') as stream:
+                summary = import_products(db, Product, stream, fmt, chunk_size, progress=report)
+            click.echo(f"✅ Imported {summary['inserted']} new products and upserted {summary['upserted']} by id "
+                       f"from {summary['rows_read']} rows ({summary['skipped']} skipped).")
+            for error in summary['errors'][:20]:
+                click.echo(f"   line {error['line']}: {error['error']}")
+        except Exception as e:
+            db.session.rollback()
+            click.echo(f"❌ ERROR: Failed to import products. Error: {e}")
+
+@db_commands.command('refresh-stats')
+def refresh_stats_command():
+    """Recomputes the inventory totals behind /api/products/stats from the product table."""
+
+    with app.app_context():
+        try:
+            refresh_stats(db, ProductStats.__table__, Product.__table__)
+            click.echo("✅ Inventory stats recomputed.")
+        except Exception as e:
+            db.session.rollback()
+            click.echo(f"❌ ERROR: Failed to refresh inventory stats. Error: {e}")
+
+
+# Background job queue commands (see jobs.py), available as 'flask jobs'
+@app.cli.group('jobs')
+def jobs_commands():
+    """Background job queue commands."""
+    pass
+
+@jobs_commands.command('work')
+@click.option('--threads', default=2, show_default=True, help='Jobs processed concurrently.')
+@click.option('--poll-interval', type=float, default=None, help='Seconds between polls of an empty queue.')
+@click.option('--once', is_flag=True, help='Exit when the queue is empty instead of waiting for work.')
+def work(threads, poll_interval, once):
+    """Runs a worker that processes queued jobs until interrupted."""
+
+    click.echo(f"⚙️ Job worker started with {threads} thread(s). Press Ctrl+C to stop.")
+    JobWorker(app, threads=threads, poll_interval=poll_interval).run(exit_when_idle=once)
+    click.echo("✅ Job worker stopped.")
+
+@jobs_commands.command('enqueue')
+@click.argument('job_type')
+@click.option('--payload', default='{}', show_default=True, help='Job payload as a JSON object.')
+def enqueue_job(job_type, payload):
+    """Queues a job, e.g. flask jobs enqueue export --payload '{"format": "csv"}'."""
+
+    with app.app_context():
+        try:
+            job = enqueue(db, Job, job_type, json.loads(payload))
+            click.echo(f"✅ Queued job {job.id} ({job.type}).")
+        except ValueError as e:
+            click.echo(f"❌ ERROR: Invalid job. {e}")
+
+@jobs_commands.command('list')
+@click.option('--status', type=click.Choice(JOB_STATUSES), default=None, help='Only show jobs in this state.')
+@click.option('--limit', default=20, show_default=True)
+def list_jobs(status, limit):
+    """Shows the most recent jobs and their progress."""
+
+    with app.app_context():
+        statement = db.select(Job).order_by(Job.id.desc()).limit(limit)
+        if status:
+            statement = statement.where(Job.status == status)
+        for job in db.session.scalars(statement):
+            progress = job.to_dict()['progress']
+            total = progress['total'] if progress['total'] is not None else '?'
+            click.echo(f"{job.id:>6}  {job.type:<20} {job.status:<10} {progress['current']}/{total}"
+                       + (f"  {job.error}" if job.error else ""))
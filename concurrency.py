@@ -0,0 +1,48 @@
+# concurrency.py
+# Optimistic locking helpers (If-Match / version checks) and atomic stock updates.
+import re
+
+from sqlalchemy import update
+
+_PRODUCT_ETAG = re.compile(r'^product-(\d+)-v(\d+)$')
+
+
+class PreconditionFailed(Exception):
+    """The client's expected version does not match the stored product."""
+
+
+def expected_version(if_match, data, product_id):
+    """
+    Returns the version the client expects to overwrite, taken from the
+    If-Match header (a product ETag) or a 'version' field in the body, or
+    None when the client did not ask for a version check.
+    """
+    if if_match and not if_match.star_tag:
+        for tag in if_match.as_set():
+            match = _PRODUCT_ETAG.match(tag)
+            if match and int(match.group(1)) == product_id:
+                return int(match.group(2))
+        # None of the tags can describe this product
+        raise PreconditionFailed("If-Match does not match this product.")
+    version = data.get('version') if isinstance(data, dict) else None
+    if version is None:
+        return None
+    if not isinstance(version, int) or isinstance(version, bool):
+        raise ValueError("version must be an integer.")
+    return version
+
+
+def adjust_stock(db, Product, product_id, delta):
+    """
+    Adds 'delta' to stock_quantity in one UPDATE ... RETURNING statement,
+    refusing to go below zero. Returns the updated row, or None when the
+    product does not exist or the stock is insufficient.
+    """
+    statement = (
+        update(Product)
+        .where(Product.id == product_id, Product.stock_quantity + delta >= 0)
+        .values(stock_quantity=Product.stock_quantity + delta, version=Product.version + 1)
+        .returning(*Product.__table__.columns)
+        .execution_options(synchronize_session=False)
+    )
+    return db.session.execute(statement).first()
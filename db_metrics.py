@@ -0,0 +1,97 @@
+# db_metrics.py
+# Query and connection-pool instrumentation for the SQLAlchemy engine.
+#
+# Statement timings come from the engine's cursor events; pool wait time is
+# measured by TimedQueuePool around each checkout. Per-request totals are kept
+# on flask.g and reported in a Server-Timing header; process totals go to the
+# metrics registry served at /metrics.
+import logging
+import time
+
+from flask import g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+QUERY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+query_duration = registry.histogram(
+    'db_query_duration_seconds', 'Time spent executing SQL statements.', QUERY_BUCKETS)
+slow_queries = registry.counter(
+    'db_slow_queries_total', 'SQL statements slower than DB_SLOW_QUERY_MS.')
+pool_wait = registry.histogram(
+    'db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection.', POOL_WAIT_BUCKETS)
+request_queries = registry.histogram(
+    'db_queries_per_request', 'SQL statements executed per HTTP request.',
+    (0, 1, 2, 3, 5, 10, 20, 50, 100))
+request_db_time = registry.histogram(
+    'db_time_per_request_seconds', 'Time spent executing SQL statements per HTTP request.', QUERY_BUCKETS)
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_wait.observe(time.perf_counter() - start)
+
+
+class DatabaseMetrics:
+    """Attaches query timing listeners to an engine and per-request accounting to an app."""
+
+    def __init__(self):
+        self.slow_query_seconds = 0.5
+
+    def init_app(self, app, engine):
+        self.slow_query_seconds = app.config.get('DB_SLOW_QUERY_MS', 500) / 1000.0
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+        pool = engine.pool
+        if isinstance(pool, QueuePool):
+            registry.gauge('db_pool_size', 'Configured pool size.', pool.size)
+            registry.gauge('db_pool_checked_out', 'Connections currently checked out.', pool.checkedout)
+            registry.gauge('db_pool_overflow', 'Connections open beyond pool_size.', pool.overflow)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # Kept on the execution context, which is discarded with the statement,
+        # so a statement that fails (no after_cursor_execute) leaves nothing behind
+        if context is not None:
+            context._metrics_query_start = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, '_metrics_query_start', None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        query_duration.observe(elapsed)
+        if has_request_context() and 'db_query_count' in g:
+            g.db_query_count += 1
+            g.db_time += elapsed
+        if elapsed >= self.slow_query_seconds:
+            slow_queries.inc()
+            logger.warning("Slow query (%.1f ms): %s", elapsed * 1000, ' '.join(statement.split())[:1000])
+
+    def _start_request(self):
+        g.db_query_count = 0
+        g.db_time = 0.0
+
+    def _finish_request(self, response):
+        if 'db_query_count' in g:
+            request_queries.observe(g.db_query_count)
+            request_db_time.observe(g.db_time)
+            response.headers.add(
+                'Server-Timing', f'db;dur={g.db_time * 1000:.2f};desc="{g.db_query_count} queries"')
+        return response
+
+
+db_metrics = DatabaseMetrics()
@@ -0,0 +1,115 @@
+# export.py
+# Streaming catalog export (NDJSON, JSON array or CSV).
+#
+# Rows are read with a column-only SELECT over a server-side cursor and encoded
+# in batches, so neither ORM instances nor the full response body are ever held
+# in memory at once.
+import csv
+import io
+
+from flask import current_app
+
+from serialization import PRODUCT_COLUMNS, row_to_dict
+
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_COLUMNS = PRODUCT_COLUMNS
+
+EXPORT_MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+    'csv': 'text/csv',
+}
+
+
+def export_statement(db, Product, filters=()):
+    """Builds the column-only SELECT used by the export, ordered by primary key."""
+    columns = [getattr(Product, name) for name in EXPORT_COLUMNS]
+    return (
+        db.select(*columns)
+        .where(*filters)
+        .order_by(Product.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+
+
+def _batches(db, statement):
+    result = db.session.execute(statement)
+    try:
+        for partition in result.partitions():
+            yield partition
+    finally:
+        result.close()
+
+
+def _ndjson_chunks(batches):
+    dumps = current_app.json.dumps
+    for batch in batches:
+        yield ''.join(dumps(row_to_dict(row)) + '\n' for row in batch)
+
+
+def _json_chunks(batches):
+    dumps = current_app.json.dumps
+    yield '['
+    first = True
+    for batch in batches:
+        # One encoder call per batch; strip the list's own brackets
+        encoded = dumps([row_to_dict(row) for row in batch])[1:-1]
+        if not encoded:
+            continue
+        yield encoded if first else ',' + encoded
+        first = False
+    yield ']'
+
+
+def _csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for batch in batches:
+        for row in batch:
+            data = row_to_dict(row)
+            writer.writerow([data[name] for name in EXPORT_COLUMNS])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+_ENCODERS = {
+    'ndjson': _ndjson_chunks,
+    'json': _json_chunks,
+    'csv': _csv_chunks,
+}
+
+
+def encode_batches(fmt, batches):
+    """Yields the encoded export body for 'fmt' from an iterable of row batches."""
+    if fmt not in _ENCODERS:
+        raise ValueError(f"format must be one of: {', '.join(_ENCODERS)}.")
+    return _ENCODERS[fmt](batches)
+
+
+def stream_products(db, Product, fmt, filters=()):
+    """Yields the encoded export body for 'fmt' one batch of rows at a time."""
+    if fmt not in _ENCODERS:
+        raise ValueError(f"format must be one of: {', '.join(_ENCODERS)}.")
+    return encode_batches(fmt, _batches(db, export_statement(db, Product, filters)))
+
+
+def keyset_batches(db, Product, filters=(), batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yields batches of export rows using one short keyset query per batch
+    instead of a single long-lived cursor, so the caller may commit between
+    batches (the background export job records progress this way).
+    """
+    columns = [getattr(Product, name) for name in EXPORT_COLUMNS]
+    last_id = 0
+    while True:
+        batch = db.session.execute(
+            db.select(*columns).where(*filters, Product.id > last_id)
+            .order_by(Product.id).limit(batch_size)).all()
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1].id
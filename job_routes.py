@@ -0,0 +1,68 @@
+# job_routes.py
+
+from flask import Blueprint, request, jsonify, send_file, url_for
+
+from jobs import JOB_STATUSES, SUCCEEDED, enqueue
+from pagination import parse_limit
+
+# Background job API (registered under '/api'; see jobs.py)
+job_api = Blueprint('job_api', __name__)
+
+
+# C: Enqueue Job
+@job_api.route('/jobs', methods=['POST'])
+def create_job():
+    from app import db, Job
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('type'), str):
+        return jsonify({"error": "Request body must be a JSON object with a 'type' field."}), 400
+    try:
+        job = enqueue(db, Job, data['type'], data.get('payload'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    response = jsonify(job.to_dict())
+    response.headers['Location'] = url_for('job_api.get_job', job_id=job.id)
+    return response, 202
+
+# R: List Recent Jobs (newest first)
+@job_api.route('/jobs', methods=['GET'])
+def list_jobs():
+    from app import db, Job
+    try:
+        limit = parse_limit(request.args.get('limit'), default=20, maximum=100)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    statement = db.select(Job).order_by(Job.id.desc()).limit(limit)
+    status = request.args.get('status')
+    if status:
+        if status not in JOB_STATUSES:
+            return jsonify({"error": f"status must be one of: {', '.join(JOB_STATUSES)}."}), 400
+        statement = statement.where(Job.status == status)
+    return jsonify({"jobs": [job.to_dict() for job in db.session.scalars(statement)]})
+
+# R: Job Status and Progress
+@job_api.route('/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    from app import db, Job
+    job = db.session.get(Job, job_id)
+    if job is None:
+        return jsonify({"error": "Job not found."}), 404
+    return jsonify(job.to_dict())
+
+# R: Download a Job's Output File (export jobs)
+@job_api.route('/jobs/<int:job_id>/download', methods=['GET'])
+def download_job_output(job_id):
+    from app import db, Job
+    job = db.session.get(Job, job_id)
+    if job is None:
+        return jsonify({"error": "Job not found."}), 404
+    if job.status != SUCCEEDED:
+        return jsonify({"error": f"Job is {job.status}; output is available once it succeeds."}), 409
+    path = (job.result or {}).get('path')
+    if not path:
+        return jsonify({"error": "This job does not produce a file."}), 404
+    try:
+        return send_file(path, as_attachment=True)
+    except FileNotFoundError:
+        # Output lives on the worker's disk; JOBS_OUTPUT_DIR must be shared with the web process
+        return jsonify({"error": "Job output file is not available on this server."}), 404
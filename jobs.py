@@ -0,0 +1,513 @@
+# jobs.py
+# Database-backed background job queue for long-running catalog operations.
+#
+# The API inserts a row into the 'job' table and returns its id right away;
+# worker threads (`flask jobs work`, or JOBS_EMBEDDED_WORKERS threads inside
+# the web process) claim queued rows with a single atomic UPDATE, run the
+# registered handler and record progress and the result on the same row.
+# No broker is needed: on PostgreSQL claims use FOR UPDATE SKIP LOCKED, so any
+# number of worker processes can share the table.
+import io
+import itertools
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import Numeric, cast, delete, func, insert, update
+
+from bulk import DEFAULT_CHUNK_SIZE
+from export import EXPORT_MIMETYPES, encode_batches, keyset_batches
+from metrics import registry
+from pagination import product_filters
+from product_import import IMPORT_FORMATS, import_products
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+JOB_STATUSES = (QUEUED, RUNNING, SUCCEEDED, FAILED)
+
+JOB_DURATION_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0)
+
+jobs_finished = registry.counter(
+    'jobs_finished_total', 'Background jobs that finished, by type and status.')
+job_duration = registry.histogram(
+    'job_duration_seconds', 'Background job run time.', JOB_DURATION_BUCKETS)
+
+
+# --- Job Types ---
+JobType = namedtuple('JobType', 'handler validate')
+
+JOB_TYPES = {}
+
+
+def job_type(name, validate=None):
+    """
+    Registers 'handler(payload, job)' for jobs of type 'name'. 'validate(payload)'
+    runs when the job is enqueued and raises ValueError for a bad payload.
+    """
+    def register(handler):
+        JOB_TYPES[name] = JobType(handler, validate)
+        return handler
+    return register
+
+
+class JobLost(Exception):
+    """Raised by JobContext.progress when the job was requeued and is no longer this run's."""
+
+
+class JobContext:
+    """Handed to job handlers for progress reporting, checkpoints and output files."""
+
+    def __init__(self, db, Job, job_id, attempt=None, checkpoint=None):
+        self.db = db
+        self.Job = Job
+        self.id = job_id
+        self.attempt = attempt
+        # Recorded by an earlier attempt; handlers resume from it
+        self.checkpoint = checkpoint
+
+    def progress(self, current, total=None, checkpoint=None):
+        """
+        Records progress, a heartbeat and optionally a 'checkpoint' (a JSON
+        resume point). This commits the session, so handlers call it at chunk
+        boundaries, where it commits the chunk's work together with the
+        checkpoint. If the job was requeued meanwhile (another run may own it
+        now) the chunk is rolled back and JobLost is raised instead.
+        """
+        Job = self.Job
+        values = {'progress_current': current, 'heartbeat_at': datetime.utcnow()}
+        if total is not None:
+            values['progress_total'] = total
+        if checkpoint is not None:
+            values['checkpoint'] = checkpoint
+        owned = self.db.session.execute(
+            update(Job).where(Job.id == self.id, Job.status == RUNNING, Job.attempts == self.attempt)
+            .values(**values).execution_options(synchronize_session=False)).rowcount
+        if not owned:
+            self.db.session.rollback()
+            raise JobLost(f"Job {self.id} was requeued while attempt {self.attempt} was running.")
+        self.db.session.commit()
+
+    def output_path(self, filename):
+        """Returns a path in JOBS_OUTPUT_DIR for a file this job produces."""
+        directory = current_app.config['JOBS_OUTPUT_DIR']
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, f"job-{self.id}-{filename}")
+
+
+# --- Uploads ---
+# Files uploaded for a job are stored in the database (job_upload rows of
+# UPLOAD_CHUNK_SIZE bytes), not on the web process's disk, so a worker in any
+# other process or on any other host can read them.
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def store_upload(db, JobUpload, stream):
+    """
+    Copies the binary 'stream' into job_upload rows inside the current
+    transaction (enqueue commits them with the job). Returns (upload_id, size).
+    """
+    upload_id = uuid.uuid4().hex
+    size = 0
+    for seq in itertools.count():
+        data = stream.read(UPLOAD_CHUNK_SIZE)
+        if not data:
+            break
+        db.session.execute(insert(JobUpload.__table__).values(upload_id=upload_id, seq=seq, data=data))
+        size += len(data)
+    return upload_id, size
+
+
+def upload_exists(db, JobUpload, upload_id):
+    return db.session.scalar(
+        db.select(JobUpload.seq).where(JobUpload.upload_id == upload_id).limit(1)) is not None
+
+
+def delete_upload(db, JobUpload, upload_id):
+    db.session.execute(delete(JobUpload.__table__).where(JobUpload.upload_id == upload_id))
+
+
+class UploadReader(io.RawIOBase):
+    """Reads a stored upload back, fetching one chunk row at a time."""
+
+    def __init__(self, db, JobUpload, upload_id):
+        self.db = db
+        self.JobUpload = JobUpload
+        self.upload_id = upload_id
+        self._seq = 0
+        self._chunk = memoryview(b'')
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self._chunk:
+            JobUpload = self.JobUpload
+            data = self.db.session.scalar(self.db.select(JobUpload.data).where(
+                JobUpload.upload_id == self.upload_id, JobUpload.seq == self._seq))
+            if data is None:
+                return 0
+            self._seq += 1
+            self._chunk = memoryview(bytes(data))
+        count = min(len(buffer), len(self._chunk))
+        buffer[:count] = self._chunk[:count]
+        self._chunk = self._chunk[count:]
+        return count
+
+
+def open_upload(db, JobUpload, upload_id):
+    """Returns a text stream over a stored upload (utf-8-sig also accepts a BOM)."""
+    reader = io.BufferedReader(UploadReader(db, JobUpload, upload_id), buffer_size=UPLOAD_CHUNK_SIZE)
+    return io.TextIOWrapper(reader, encoding='utf-8-sig', newline='')
+
+
+# --- Queue Operations ---
+def validate_payload(job_type_name, payload):
+    """Raises ValueError unless 'payload' is acceptable for 'job_type_name'."""
+    spec = JOB_TYPES.get(job_type_name)
+    if spec is None:
+        raise ValueError(f"type must be one of: {', '.join(sorted(JOB_TYPES))}.")
+    if not isinstance(payload, dict):
+        raise ValueError("payload must be a JSON object.")
+    if spec.validate:
+        spec.validate(payload)
+
+
+def enqueue(db, Job, job_type_name, payload=None):
+    """Validates and queues a job, returning the committed Job."""
+    payload = {} if payload is None else payload
+    validate_payload(job_type_name, payload)
+    job = Job(type=job_type_name, status=QUEUED, payload=payload)
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def claim_next(db, Job, worker):
+    """Atomically marks the oldest queued job as running and returns its id (or None)."""
+    now = datetime.utcnow()
+    oldest = (
+        db.select(Job.id).where(Job.status == QUEUED)
+        .order_by(Job.id).limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    statement = (
+        update(Job)
+        .where(Job.id == oldest, Job.status == QUEUED)
+        .values(status=RUNNING, worker=worker, started_at=now, heartbeat_at=now,
+                attempts=Job.attempts + 1)
+        .returning(Job.id)
+        .execution_options(synchronize_session=False)
+    )
+    job_id = db.session.execute(statement).scalar()
+    db.session.commit()
+    return job_id
+
+
+def finish(db, Job, job_id, status, result=None, error=None, attempt=None):
+    """Records the outcome; with 'attempt', only if the job still belongs to that attempt."""
+    owned = (Job.id == job_id,) if attempt is None else (Job.id == job_id, Job.attempts == attempt)
+    db.session.execute(
+        update(Job).where(*owned)
+        .values(status=status, result=result, error=error, finished_at=datetime.utcnow())
+        .execution_options(synchronize_session=False))
+    db.session.commit()
+
+
+def run_job(db, Job, job_id):
+    """
+    Runs a claimed job and records its result or error. Returns the final
+    status, or None if the job was requeued while it ran.
+    """
+    job = db.session.get(Job, job_id)
+    job_type_name, attempt = job.type, job.attempts
+    spec = JOB_TYPES.get(job_type_name)
+    context = JobContext(db, Job, job_id, attempt, job.checkpoint)
+    started = time.perf_counter()
+    try:
+        if spec is None:
+            raise ValueError(f"Unknown job type '{job_type_name}'.")
+        result = spec.handler(dict(job.payload or {}), context)
+        db.session.commit()
+        status, error = SUCCEEDED, None
+    except JobLost as e:
+        # Requeued as stale while still running; the next attempt resumes from the checkpoint
+        db.session.rollback()
+        logger.warning("%s", e)
+        return None
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Job %s (%s) failed", job_id, job_type_name)
+        status, result, error = FAILED, None, f"{e.__class__.__name__}: {e}"
+    finish(db, Job, job_id, status, result=result, error=error, attempt=attempt)
+    jobs_finished.inc(type=job_type_name, status=status)
+    job_duration.observe(time.perf_counter() - started, type=job_type_name)
+    return status
+
+
+def requeue_stale(db, Job, stale_after, max_attempts):
+    """
+    Returns running jobs whose worker stopped heartbeating to the queue, or
+    fails them once they have used up 'max_attempts'. Returns the number requeued.
+    A requeued job resumes from its last checkpoint; if its old run is in fact
+    still going, its next progress() call fails (JobLost) and rolls back.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_after)
+    stale = (Job.status == RUNNING, Job.heartbeat_at < cutoff)
+    db.session.execute(
+        update(Job).where(*stale, Job.attempts >= max_attempts)
+        .values(status=FAILED, error="Worker stopped responding.", finished_at=datetime.utcnow())
+        .execution_options(synchronize_session=False))
+    requeued = db.session.execute(
+        update(Job).where(*stale, Job.attempts < max_attempts)
+        .values(status=QUEUED, worker=None)
+        .execution_options(synchronize_session=False)).rowcount
+    db.session.commit()
+    return requeued
+
+
+# --- Worker ---
+class JobWorker:
+    """Runs queued jobs on a pool of threads, each with its own app context and session."""
+
+    def __init__(self, app, threads=2, poll_interval=None):
+        self.app = app
+        self.threads = threads
+        self.poll_interval = poll_interval or app.config['JOBS_POLL_INTERVAL']
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._threads = []
+        self._last_requeue = None
+        self._requeue_lock = threading.Lock()
+
+    def start(self, exit_when_idle=False):
+        for index in range(self.threads):
+            thread = threading.Thread(target=self._loop, args=(index, exit_when_idle),
+                                      name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self, timeout=None):
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def run(self, exit_when_idle=False):
+        """Runs until stopped (or, with exit_when_idle, until the queue is empty)."""
+        self.start(exit_when_idle)
+        try:
+            while any(thread.is_alive() for thread in self._threads):
+                self.join(timeout=0.5)
+        except KeyboardInterrupt:
+            # Let running jobs finish; unfinished ones would be requeued as stale anyway
+            self.stop()
+            self.join()
+
+    def _maybe_requeue(self, db, Job):
+        config = self.app.config
+        with self._requeue_lock:
+            if (self._last_requeue is not None
+                    and time.monotonic() - self._last_requeue < config['JOBS_STALE_AFTER'] / 2):
+                return
+            self._last_requeue = time.monotonic()
+        requeued = requeue_stale(db, Job, config['JOBS_STALE_AFTER'], config['JOBS_MAX_ATTEMPTS'])
+        if requeued:
+            logger.warning("Requeued %d stale job(s)", requeued)
+
+    def _loop(self, index, exit_when_idle):
+        from app import db, Job
+        worker = f"{self.name}:{index}"
+        while not self._stop.is_set():
+            with self.app.app_context():
+                try:
+                    self._maybe_requeue(db, Job)
+                    job_id = claim_next(db, Job, worker)
+                    if job_id is not None:
+                        run_job(db, Job, job_id)
+                except Exception:
+                    db.session.rollback()
+                    logger.exception("Job worker %s hit an error", worker)
+                    job_id = None
+            if job_id is None:
+                if exit_when_idle:
+                    return
+                self._stop.wait(self.poll_interval)
+
+
+class JobQueue:
+    """Reads the JOBS_* settings and optionally runs workers inside the web process."""
+
+    def __init__(self):
+        self.embedded_worker = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault('JOBS_OUTPUT_DIR', os.path.join(app.instance_path, 'job_output'))
+        app.config.setdefault('JOBS_EMBEDDED_WORKERS', 0)
+        app.config.setdefault('JOBS_POLL_INTERVAL', 1.0)
+        app.config.setdefault('JOBS_STALE_AFTER', 600)
+        app.config.setdefault('JOBS_MAX_ATTEMPTS', 3)
+        if app.config['JOBS_EMBEDDED_WORKERS'] > 0:
+            # Started by the first request, not at import, so CLI commands never spawn workers
+            app.before_request(self._start_embedded)
+
+    def _start_embedded(self):
+        if self.embedded_worker is not None:
+            return
+        with self._lock:
+            if self.embedded_worker is None:
+                app = current_app._get_current_object()
+                worker = JobWorker(app, threads=app.config['JOBS_EMBEDDED_WORKERS'])
+                worker.start()
+                self.embedded_worker = worker
+
+
+job_queue = JobQueue()
+
+
+# --- Job Handlers ---
+def _payload_filters(payload, Product):
+    """Builds product filters from the payload's 'filters' object (same keys as the list API)."""
+    filters = payload.get('filters') or {}
+    if not isinstance(filters, dict):
+        raise ValueError("filters must be a JSON object.")
+    # product_filters parses query-string values, so hand it strings
+    return product_filters({key: str(value).lower() if isinstance(value, bool) else str(value)
+                            for key, value in filters.items() if value is not None}, Product)
+
+
+def _count(db, Product, filters):
+    return db.session.scalar(db.select(func.count()).select_from(Product).where(*filters))
+
+
+def validate_export(payload):
+    from app import Product
+    fmt = payload.get('format', 'ndjson')
+    if fmt not in EXPORT_MIMETYPES:
+        raise ValueError(f"format must be one of: {', '.join(EXPORT_MIMETYPES)}.")
+    _payload_filters(payload, Product)
+
+
+@job_type('export', validate=validate_export)
+def export_job(payload, job):
+    """Writes the (filtered) catalog to a file in JOBS_OUTPUT_DIR."""
+    from app import db, Product
+    fmt = payload.get('format', 'ndjson')
+    filters = _payload_filters(payload, Product)
+    total = _count(db, Product, filters)
+    job.progress(0, total)
+
+    def batches():
+        done = 0
+        for batch in keyset_batches(db, Product, filters):
+            yield batch
+            done += len(batch)
+            job.progress(done)
+
+    path = job.output_path(f"products.{fmt}")
+    partial_path = path + '.part'
+    with open(partial_path, 'w', encoding='utf-8', newline='') as f:
+        for chunk in encode_batches(fmt, batches()):
+            f.write(chunk)
+    os.replace(partial_path, path)
+    return {'format': fmt, 'rows': total, 'path': path, 'bytes': os.path.getsize(path)}
+
+
+def validate_price_change(payload):
+    from app import Product
+    modes = [key for key in ('percent', 'price') if payload.get(key) is not None]
+    if len(modes) != 1:
+        raise ValueError("Provide exactly one of 'percent' or 'price'.")
+    value = payload[modes[0]]
+    if not isinstance(value, (int, float)) or isinstance(value, bool):
+        raise ValueError(f"{modes[0]} must be a number.")
+    if modes[0] == 'percent' and value < -100:
+        raise ValueError("percent cannot be below -100.")
+    if modes[0] == 'price' and value < 0:
+        raise ValueError("Price cannot be negative.")
+    _payload_filters(payload, Product)
+
+
+@job_type('bulk_price_change', validate=validate_price_change)
+def bulk_price_change_job(payload, job):
+    """
+    Sets every matching product's price, or scales it by 'percent' (rounded to
+    cents). Runs in id-ordered chunks, committing each one with its progress
+    and a checkpoint.
+    """
+    from app import db, Product
+    filters = _payload_filters(payload, Product)
+    if payload.get('percent') is not None:
+        factor = 1 + payload['percent'] / 100.0
+        new_price = func.round(cast(Product.price * factor, Numeric), 2)
+    else:
+        new_price = float(payload['price'])
+    chunk_size = current_app.config.get('BULK_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+    # Resumes after the last committed chunk, so no price is changed twice
+    checkpoint = job.checkpoint or {}
+    done, last_id = checkpoint.get('done', 0), checkpoint.get('last_id', 0)
+    job.progress(done, done + _count(db, Product, (*filters, Product.id > last_id)))
+
+    while True:
+        ids = db.session.scalars(
+            db.select(Product.id).where(*filters, Product.id > last_id)
+            .order_by(Product.id).limit(chunk_size)).all()
+        if not ids:
+            break
+        db.session.execute(
+            update(Product).where(Product.id.in_(ids))
+            .values(price=new_price, version=Product.version + 1)
+            .execution_options(synchronize_session=False))
+        done += len(ids)
+        last_id = ids[-1]
+        job.progress(done, checkpoint={'done': done, 'last_id': last_id})
+    return {'updated': done}
+
+
+def validate_import(payload):
+    from app import db, JobUpload
+    if payload.get('format') not in IMPORT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(IMPORT_FORMATS)}.")
+    upload_id = payload.get('upload')
+    if not isinstance(upload_id, str) or not upload_exists(db, JobUpload, upload_id):
+        raise ValueError("upload must name a file uploaded through /api/products/import.")
+
+
+@job_type('import', validate=validate_import)
+def import_job(payload, job):
+    """
+    Imports an uploaded CSV/NDJSON file (see product_import.py), resuming after
+    the last committed chunk if the job was requeued, then deletes the upload.
+    """
+    from app import db, Product, JobUpload
+    upload_id = payload['upload']
+    if job.checkpoint is None:
+        job.progress(0)
+    try:
+        with open_upload(db, JobUpload, upload_id) as stream:
+            summary = import_products(
+                db, Product, stream, payload['format'], checkpoint=job.checkpoint,
+                progress=lambda summary, checkpoint: job.progress(summary['rows_read'], checkpoint=checkpoint))
+    except JobLost:
+        # The attempt that now owns the job still needs the upload
+        raise
+    except Exception:
+        db.session.rollback()
+        delete_upload(db, JobUpload, upload_id)
+        db.session.commit()
+        raise
+    delete_upload(db, JobUpload, upload_id)
+    db.session.commit()
+    return summary
@@ -0,0 +1,175 @@
+# metrics.py
+# Minimal in-process metrics registry rendered in the Prometheus text format.
+#
+# Values are per process: under gunicorn each worker keeps its own registry,
+# so scrape every worker or sum the series in Prometheus.
+import threading
+from collections import deque
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+DEFAULT_WINDOW = 1024
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(key):
+    if not key:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in key) + '}'
+
+
+class Counter:
+    """Monotonically increasing value, optionally split by labels."""
+    kind = 'counter'
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Gauge:
+    """Value read from a callback at scrape time."""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, callback):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+
+    def samples(self):
+        value = self.callback()
+        return [] if value is None else [(self.name, (), value)]
+
+
+class Histogram:
+    """Cumulative bucket counts plus sum and count, optionally split by labels."""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][index] += 1
+                    break
+            series['sum'] += value
+            series['count'] += 1
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, series in self._series.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, series['counts']):
+                    cumulative += count
+                    samples.append((f'{self.name}_bucket', key + (('le', repr(bound)),), cumulative))
+                samples.append((f'{self.name}_bucket', key + (('le', '+Inf'),), series['count']))
+                samples.append((f'{self.name}_sum', key, series['sum']))
+                samples.append((f'{self.name}_count', key, series['count']))
+        return samples
+
+
+class Summary:
+    """
+    Quantiles over a sliding window of the most recent observations, plus
+    all-time sum and count, optionally split by labels.
+    """
+    kind = 'summary'
+
+    def __init__(self, name, documentation, quantiles=DEFAULT_QUANTILES, window=DEFAULT_WINDOW):
+        self.name = name
+        self.documentation = documentation
+        self.quantiles = quantiles
+        self.window = window
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'recent': deque(maxlen=self.window), 'sum': 0.0, 'count': 0}
+            series['recent'].append(value)
+            series['sum'] += value
+            series['count'] += 1
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            snapshot = [(key, sorted(series['recent']), series['sum'], series['count'])
+                        for key, series in self._series.items()]
+        for key, recent, total, count in snapshot:
+            for quantile in self.quantiles:
+                index = min(int(quantile * len(recent)), len(recent) - 1)
+                samples.append((self.name, key + (('quantile', repr(quantile)),), recent[index]))
+            samples.append((f'{self.name}_sum', key, total))
+            samples.append((f'{self.name}_count', key, count))
+        return samples
+
+
+class MetricsRegistry:
+    """Holds metrics by name and renders them for a /metrics scrape."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation):
+        return self._register(Counter(name, documentation))
+
+    def gauge(self, name, documentation, callback):
+        return self._register(Gauge(name, documentation, callback))
+
+    def histogram(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, buckets))
+
+    def summary(self, name, documentation, quantiles=DEFAULT_QUANTILES, window=DEFAULT_WINDOW):
+        return self._register(Summary(name, documentation, quantiles, window))
+
+    def render(self):
+        """Returns every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, key, value in metric.samples():
+                lines.append(f'{name}{_format_labels(key)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
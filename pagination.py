@@ -0,0 +1,217 @@
+# pagination.py
+# Keyset (cursor) pagination and query-string filters for the product listing,
+# plus page-number pagination for the HTML list.
+#
+# API pages are resumed from the last row seen instead of an OFFSET, so every
+# page costs the same index range scan no matter how deep the client has walked.
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Columns clients may sort by. Each one is paired with the primary key as a
+# tie-breaker so the ordering is total and a cursor identifies one position.
+SORT_KEYS = ('id', 'created_at', 'price', 'stock_quantity', 'name')
+
+_TRUE_VALUES = ('true', '1', 'yes', 'on')
+_FALSE_VALUES = ('false', '0', 'no', 'off')
+
+
+# --- Query-string Parsing ---
+def parse_limit(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Parses the 'limit' parameter, clamping it to [1, maximum]."""
+    if value is None or str(value).strip() == '':
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError("limit must be a valid integer.")
+    if limit < 1:
+        raise ValueError("limit must be at least 1.")
+    return min(limit, maximum)
+
+
+def parse_sort(sort_value, order_value):
+    """Returns (sort_key, descending) from the 'sort' and 'order' parameters."""
+    sort_key = (sort_value or 'id').strip()
+    if sort_key not in SORT_KEYS:
+        raise ValueError(f"sort must be one of: {', '.join(SORT_KEYS)}.")
+    order = (order_value or 'asc').strip().lower()
+    if order not in ('asc', 'desc'):
+        raise ValueError("order must be 'asc' or 'desc'.")
+    return sort_key, order == 'desc'
+
+
+def parse_bool(value, field):
+    """Parses a boolean query-string value such as 'true' or '0'."""
+    normalized = str(value).strip().lower()
+    if normalized in _TRUE_VALUES:
+        return True
+    if normalized in _FALSE_VALUES:
+        return False
+    raise ValueError(f"{field} must be a boolean (true/false).")
+
+
+def _parse_number(args, field, target_type):
+    value = args.get(field)
+    if value is None or str(value).strip() == '':
+        return None
+    try:
+        return target_type(value)
+    except ValueError:
+        raise ValueError(f"{field} must be a valid number of type {target_type.__name__}.")
+
+
+def product_filters(args, Product):
+    """Builds the WHERE clauses for the supported product filters in 'args'."""
+    filters = []
+
+    is_available = args.get('is_available')
+    if is_available is not None and is_available.strip() != '':
+        filters.append(Product.is_available == parse_bool(is_available, 'is_available'))
+
+    min_price = _parse_number(args, 'min_price', float)
+    max_price = _parse_number(args, 'max_price', float)
+    if min_price is not None:
+        filters.append(Product.price >= min_price)
+    if max_price is not None:
+        filters.append(Product.price <= max_price)
+
+    min_stock = _parse_number(args, 'min_stock', int)
+    max_stock = _parse_number(args, 'max_stock', int)
+    if min_stock is not None:
+        filters.append(Product.stock_quantity >= min_stock)
+    if max_stock is not None:
+        filters.append(Product.stock_quantity <= max_stock)
+
+    name_prefix = args.get('name_prefix')
+    if name_prefix:
+        # LIKE 'prefix%' can use the name index; autoescape keeps % and _ literal.
+        filters.append(Product.name.startswith(name_prefix, autoescape=True))
+
+    return filters
+
+
+# --- Cursors ---
+# JSON type a cursor value must have for each sort key (None is allowed for NULL
+# sort values); anything else would reach the database as a mistyped comparison.
+_CURSOR_VALUE_TYPES = {
+    'created_at': (str,),
+    'price': (int, float),
+    'stock_quantity': (int,),
+    'name': (str,),
+    'rank': (int, float),
+}
+
+
+def encode_cursor(sort_key, descending, value, row_id):
+    """Encodes the position after (value, row_id) as an opaque URL-safe token."""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([sort_key, 'desc' if descending else 'asc', value, row_id],
+                         separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort_key, descending):
+    """Decodes a cursor into (value, row_id), or None when no cursor is given."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_key, cursor_order, value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise ValueError("cursor is malformed.")
+    if cursor_key != sort_key or cursor_order != ('desc' if descending else 'asc'):
+        raise ValueError("cursor does not match the requested sort order.")
+    if not isinstance(row_id, int) or isinstance(row_id, bool):
+        raise ValueError("cursor is malformed.")
+    expected = _CURSOR_VALUE_TYPES.get(sort_key)
+    if expected and value is not None and (not isinstance(value, expected) or isinstance(value, bool)):
+        raise ValueError("cursor is malformed.")
+    if sort_key == 'created_at' and value is not None:
+        try:
+            value = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise ValueError("cursor is malformed.")
+    return value, row_id
+
+
+# --- Keyset Query ---
+def keyset_order(Product, sort_key, descending):
+    """Returns the ORDER BY clauses for the given sort key."""
+    columns = [Product.id] if sort_key == 'id' else [getattr(Product, sort_key), Product.id]
+    return [column.desc() if descending else column.asc() for column in columns]
+
+
+def keyset_page(query, Product, sort_key, descending, limit, after=None):
+    """
+    Applies keyset ordering to 'query' and returns (rows, next_cursor).
+
+    'after' is the decoded cursor (value, row_id); next_cursor is None on the
+    last page. One extra row is fetched to detect whether another page exists.
+    """
+    if after is not None:
+        value, row_id = after
+        if sort_key == 'id':
+            position = Product.id < row_id if descending else Product.id > row_id
+        else:
+            key = tuple_(getattr(Product, sort_key), Product.id)
+            position = key < (value, row_id) if descending else key > (value, row_id)
+        query = query.filter(position)
+
+    rows = query.order_by(*keyset_order(Product, sort_key, descending)).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort_key, descending, getattr(last, sort_key), last.id)
+    return rows, next_cursor
+
+
+# --- Page-number Pagination (HTML list) ---
+def search_filter(Product, term):
+    """Case-insensitive substring match on name or description."""
+    pattern = f"%{escape_like(term)}%"
+    return Product.name.ilike(pattern, escape='\\') | Product.description.ilike(pattern, escape='\\')
+
+
+def escape_like(term):
+    """Escapes LIKE wildcards so user input matches literally."""
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def offset_page(query, Product, sort_key, descending, page, size):
+    """
+    Returns (rows, has_next) for a 1-based page number.
+
+    No COUNT(*) is issued: one extra row is fetched to tell whether a next
+    page exists.
+    """
+    rows = (
+        query.order_by(*keyset_order(Product, sort_key, descending))
+        .offset((page - 1) * size)
+        .limit(size + 1)
+        .all()
+    )
+    return rows[:size], len(rows) > size
+
+
+def estimated_count(db, Product):
+    """
+    Returns the planner's row estimate for the product table on PostgreSQL
+    (kept current by autovacuum/ANALYZE), or None on other databases.
+    """
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return None
+    estimate = db.session.execute(
+        db.text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)"),
+        {'table': Product.__table__.name},
+    ).scalar()
+    return estimate if estimate is not None and estimate >= 0 else None
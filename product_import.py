@@ -0,0 +1,228 @@
+# product_import.py
+# Streaming CSV/NDJSON product import for `flask db import-products` and
+# the /api/products/import upload (run as a background job, see jobs.py).
+#
+# Records are read one at a time, validated with the same rules as the form
+# and API handlers, and loaded in chunks of IMPORT_CHUNK_SIZE rows, so memory
+# use does not grow with the file. On PostgreSQL each chunk is COPYed into a
+# temporary staging table and merged into product with set-based INSERT ...
+# SELECT statements; other databases fall back to executemany INSERTs. Each
+# chunk commits on its own.
+import csv
+import io
+import json
+import os
+
+from sqlalchemy import insert, text
+
+from bulk import DEFAULT_CHUNK_SIZE, PRODUCT_FIELDS, bulk_upsert, null_fields, product_values
+from pagination import parse_bool
+
+IMPORT_CHUNK_SIZE = 50000
+IMPORT_FORMATS = ('csv', 'ndjson')
+IMPORT_MIMETYPES = {'text/csv': 'csv', 'application/x-ndjson': 'ndjson', 'application/jsonl': 'ndjson'}
+# Invalid rows are skipped; only the first ones are reported back in detail
+MAX_REPORTED_ERRORS = 100
+
+NAME_MAX_LENGTH = 100
+DESCRIPTION_MAX_LENGTH = 200
+
+STAGING_TABLE = 'product_import_staging'
+STAGING_COLUMNS = ('line', 'id') + PRODUCT_FIELDS
+
+
+def import_format(filename=None, fmt=None):
+    """Returns the import format named by 'fmt', or guessed from the file extension."""
+    if fmt:
+        fmt = fmt.strip().lower()
+    elif filename:
+        extension = os.path.splitext(filename)[1].lower()
+        fmt = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}.get(extension)
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(IMPORT_FORMATS)}.")
+    return fmt
+
+
+# --- Reading and Validation ---
+def read_records(stream, fmt):
+    """Yields (line_number, record) pairs; 'record' is None for an unparsable NDJSON line."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        if not reader.fieldnames or 'name' not in reader.fieldnames:
+            raise ValueError("CSV header must include a 'name' column.")
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError:
+            yield line_number, None
+
+
+def _csv_data(record, convert):
+    """Converts a CSV record's strings the way the form handlers do (safe_convert)."""
+    is_available = record.get('is_available')
+    return {
+        'name': (record.get('name') or '').strip(),
+        'description': (record.get('description') or '').strip() or None,
+        'price': convert(record.get('price'), float, 0.00),
+        'stock_quantity': convert(record.get('stock_quantity'), int, 0),
+        'is_available': (True if is_available is None or not is_available.strip()
+                         else parse_bool(is_available, 'is_available')),
+        'id': convert(record.get('id'), int, None),
+    }
+
+
+def clean_record(record, fmt, validate, convert):
+    """
+    Validates one record with 'validate' (validate_product_input) after the
+    CSV string conversions done by 'convert' (safe_convert). Returns
+    (values, None) for a valid record or (None, error_message).
+    """
+    if fmt == 'csv':
+        try:
+            data = _csv_data(record, convert)
+        except ValueError as e:
+            return None, str(e)
+    elif isinstance(record, dict):
+        data = record
+    else:
+        return None, "Each line must be a JSON object."
+
+    if not data.get('name'):
+        return None, "Name field is required."
+    nulls = null_fields(data)
+    if nulls:
+        return None, f"{', '.join(nulls)} cannot be null."
+    validation_message, error_code = validate(data)
+    if error_code:
+        return None, validation_message
+    if len(data['name']) > NAME_MAX_LENGTH:
+        return None, f"Name cannot be longer than {NAME_MAX_LENGTH} characters."
+    description = data.get('description')
+    if description is not None and (not isinstance(description, str) or len(description) > DESCRIPTION_MAX_LENGTH):
+        return None, f"Description must be a string of at most {DESCRIPTION_MAX_LENGTH} characters."
+
+    values = product_values(data)
+    product_id = data.get('id')
+    if product_id is not None:
+        if not isinstance(product_id, int) or isinstance(product_id, bool) or product_id < 1:
+            return None, "id must be a positive integer."
+        values['id'] = product_id
+    return values, None
+
+
+# --- Loaders (one chunk per call, inside the caller's transaction) ---
+def copy_chunk(db, Product, rows):
+    """
+    PostgreSQL: COPY 'rows' into a temporary staging table, then merge them into
+    product with two set-based statements (rows with ids first). Returns (inserted, upserted).
+    """
+    table = Product.__table__.name
+    fields = ', '.join(PRODUCT_FIELDS)
+    connection = db.session.connection()
+    connection.execute(text(
+        f"CREATE TEMPORARY TABLE {STAGING_TABLE} ("
+        "line bigint, id integer, name varchar(100), description varchar(200), "
+        "price double precision, stock_quantity integer, is_available boolean"
+        ") ON COMMIT DROP"))
+
+    # Strings are quoted and NULLs are not, so COPY keeps '' and NULL apart
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+    for row in rows:
+        writer.writerow([row.get(column) for column in STAGING_COLUMNS])
+    buffer.seek(0)
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {STAGING_TABLE} ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+    # Rows with ids go first and move the id sequence past them, so the
+    # generated ids below cannot collide with one named in this chunk.
+    # The last occurrence of an id in the chunk wins
+    upserted = connection.execute(text(
+        f"INSERT INTO {table} (id, {fields}, created_at, version) "
+        f"SELECT DISTINCT ON (id) id, {fields}, timezone('utc', now()), 1 FROM {STAGING_TABLE} "
+        "WHERE id IS NOT NULL ORDER BY id, line DESC "
+        "ON CONFLICT (id) DO UPDATE SET "
+        + ', '.join(f"{field} = EXCLUDED.{field}" for field in PRODUCT_FIELDS)
+        + f", version = {table}.version + 1")).rowcount
+    if upserted:
+        connection.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"GREATEST((SELECT MAX(id) FROM {table}), 1))"))
+    inserted = connection.execute(text(
+        f"INSERT INTO {table} ({fields}, created_at, version) "
+        f"SELECT {fields}, timezone('utc', now()), 1 FROM {STAGING_TABLE} "
+        "WHERE id IS NULL ORDER BY line")).rowcount
+    return inserted, upserted
+
+
+def executemany_chunk(db, Product, rows):
+    """Portable fallback: bulk_upsert for rows with ids, then executemany INSERT for new rows."""
+    new_rows = [{field: row[field] for field in PRODUCT_FIELDS} for row in rows if 'id' not in row]
+    id_rows = [{field: row[field] for field in ('id',) + PRODUCT_FIELDS} for row in rows if 'id' in row]
+    if id_rows:
+        bulk_upsert(db, Product, id_rows, DEFAULT_CHUNK_SIZE)
+    if new_rows:
+        db.session.connection().execute(insert(Product.__table__), new_rows)
+    return len(new_rows), len(id_rows)
+
+
+def import_products(db, Product, stream, fmt, chunk_size=IMPORT_CHUNK_SIZE, progress=None, checkpoint=None):
+    """
+    Imports every valid record from the text 'stream' and returns a summary
+    dict. Records with an 'id' update that product (or create it with that id);
+    the rest are inserted. 'progress(summary, checkpoint)' is called inside each
+    chunk's transaction, just before it commits; passing that 'checkpoint' back
+    resumes an interrupted import of the same stream after that chunk.
+    """
+    # Imported here: product_routes and app import this module indirectly
+    from app import safe_convert
+    from product_routes import validate_product_input
+
+    load_chunk = copy_chunk if db.session.get_bind().dialect.name == 'postgresql' else executemany_chunk
+    summary = {'rows_read': 0, 'inserted': 0, 'upserted': 0, 'skipped': 0, 'errors': []}
+    resume_after = 0
+    if checkpoint:
+        saved = checkpoint['summary']
+        summary, resume_after = dict(saved, errors=list(saved['errors'])), checkpoint['line']
+
+    def load(rows):
+        try:
+            inserted, upserted = load_chunk(db, Product, rows)
+            summary['inserted'] += inserted
+            summary['upserted'] += upserted
+            if progress:
+                progress(summary, {'line': rows[-1]['line'], 'summary': summary})
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    rows = []
+    for line, record in read_records(stream, fmt):
+        if line <= resume_after:
+            continue
+        summary['rows_read'] += 1
+        values, error = (clean_record(record, fmt, validate_product_input, safe_convert)
+                         if record is not None else (None, "Invalid JSON."))
+        if error:
+            summary['skipped'] += 1
+            if len(summary['errors']) < MAX_REPORTED_ERRORS:
+                summary['errors'].append({"line": line, "error": error})
+            continue
+        values['line'] = line
+        rows.append(values)
+        if len(rows) >= chunk_size:
+            load(rows)
+            rows = []
+    if rows:
+        load(rows)
+    return summary
@@ -1,8 +1,22 @@
 # product_routes.py
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context, url_for
+from sqlalchemy.orm.exc import StaleDataError
 import click
 
+from cache import product_cache
+from bulk import (DEFAULT_CHUNK_SIZE, product_values, validate_items, current_versions,
+                  bulk_insert, bulk_upsert, bulk_update, bulk_delete)
+from export import EXPORT_MIMETYPES, stream_products
+from serialization import product_columns, row_to_dict
+from search import search_products
+from concurrency import PreconditionFailed, expected_version, adjust_stock
+from pagination import parse_limit, parse_sort, product_filters, decode_cursor, keyset_page
+from product_import import IMPORT_MIMETYPES, import_format
+from jobs import enqueue, store_upload
+from stats import (DEFAULT_LOW_STOCK_THRESHOLD, DEFAULT_LOW_STOCK_LIMIT, MAX_LOW_STOCK_LIMIT,
+                   inventory_totals, low_stock)
+
 # 1. Initialize the Blueprint (named 'product_api')
 product_api = Blueprint('product_api', __name__)
 
@@ -40,6 +54,21 @@ def validate_product_input(data):
     return "Valid", None
 
 
+# --- Concurrency Errors ---
+@product_api.errorhandler(PreconditionFailed)
+def handle_precondition_failed(e):
+    from app import db
+    db.session.rollback()
+    return jsonify({"error": str(e)}), 412
+
+@product_api.errorhandler(StaleDataError)
+def handle_stale_data(e):
+    # Another request changed or deleted the row between our read and write
+    from app import db
+    db.session.rollback()
+    return jsonify({"error": "Product was modified concurrently; reload it and retry."}), 409
+
+
 # --- CRUD Routes (registered on the Blueprint) ---
 
 # C: Create Product
@@ -64,21 +93,127 @@ def create_product():
     db.session.commit()
     return jsonify(new_product.to_dict()), 201
 
-# R: List All Products
+# R: List Products (keyset-paginated, filterable, sortable)
 @product_api.route('/products', methods=['GET'])
 def list_products():
-    from app import Product
-    products = Product.query.all()
-    return jsonify([product.to_dict() for product in products])
+    from app import db, Product
+
+    def build():
+        try:
+            limit = parse_limit(request.args.get('limit'))
+            sort_key, descending = parse_sort(request.args.get('sort'), request.args.get('order'))
+            filters = product_filters(request.args, Product)
+            after = decode_cursor(request.args.get('cursor'), sort_key, descending)
+        except ValueError as e:
+            return current_app.json.dumps({"error": str(e)}), 400
+
+        # Column tuples, not ORM instances: no identity map or attribute instrumentation
+        query = db.session.query(*product_columns(Product)).filter(*filters)
+        rows, next_cursor = keyset_page(query, Product, sort_key, descending, limit, after)
+        return current_app.json.dumps({
+            "products": [row_to_dict(row) for row in rows],
+            "next_cursor": next_cursor,
+        }), 200
+
+    return product_cache.json_response(build)
+
+# R: Search Products (ranked, keyset-paginated)
+@product_api.route('/products/search', methods=['GET'])
+def search_products_api():
+    from app import db, Product
+
+    def build():
+        term = request.args.get('q', '').strip()
+        if not term:
+            return current_app.json.dumps({"error": "q parameter is required."}), 400
+        try:
+            limit = parse_limit(request.args.get('limit'))
+            filters = product_filters(request.args, Product)
+            after = decode_cursor(request.args.get('cursor'), 'rank', True)
+        except ValueError as e:
+            return current_app.json.dumps({"error": str(e)}), 400
+
+        rows, next_cursor = search_products(db, Product, term, limit, after, filters)
+        return current_app.json.dumps({
+            "products": [dict(row_to_dict(row), rank=row.rank) for row in rows],
+            "next_cursor": next_cursor,
+        }), 200
+
+    return product_cache.json_response(build)
+
+# R: Inventory Stats (precomputed totals plus the lowest-stock products)
+@product_api.route('/products/stats', methods=['GET'])
+def product_stats():
+    from app import db, Product, ProductStats, safe_convert
+
+    def build():
+        try:
+            threshold = safe_convert(request.args.get('low_stock_threshold'), int,
+                                     current_app.config.get('LOW_STOCK_THRESHOLD', DEFAULT_LOW_STOCK_THRESHOLD))
+            limit = parse_limit(request.args.get('low_stock_limit'),
+                                default=DEFAULT_LOW_STOCK_LIMIT, maximum=MAX_LOW_STOCK_LIMIT)
+        except ValueError as e:
+            return current_app.json.dumps({"error": str(e)}), 400
+
+        rows = low_stock(db, Product, product_columns(Product), threshold, limit)
+        return current_app.json.dumps(dict(
+            inventory_totals(db, ProductStats),
+            low_stock={"threshold": threshold, "products": [row_to_dict(row) for row in rows]},
+        )), 200
+
+    return product_cache.json_response(build)
+
+# R: Export Full Catalog (streamed)
+@product_api.route('/products/export', methods=['GET'])
+def export_products():
+    from app import db, Product
+    fmt = request.args.get('format', 'ndjson').strip().lower()
+    try:
+        filters = product_filters(request.args, Product)
+        chunks = stream_products(db, Product, fmt, filters)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    response = Response(stream_with_context(chunks), mimetype=EXPORT_MIMETYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename=products.{fmt}'
+    return response
+
+# C: Import Products from an uploaded CSV/NDJSON file (runs as a background job)
+@product_api.route('/products/import', methods=['POST'])
+def import_products_api():
+    from app import db, Job, JobUpload
+    # Either a multipart 'file' field or the raw request body
+    upload = request.files.get('file')
+    try:
+        fmt = import_format(upload.filename if upload else None,
+                            request.args.get('format') or IMPORT_MIMETYPES.get(request.mimetype))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Stored in the database in blocks (never held in memory), so a worker in
+    # another process can read it; enqueue commits it together with the job
+    upload_id, size = store_upload(db, JobUpload, upload.stream if upload else request.stream)
+    if not size:
+        db.session.rollback()
+        return jsonify({"error": "Uploaded file is empty."}), 400
+
+    job = enqueue(db, Job, 'import', {"upload": upload_id, "format": fmt})
+    response = jsonify(job.to_dict())
+    response.headers['Location'] = url_for('job_api.get_job', job_id=job.id)
+    return response, 202
 
 # R: Read Single Product
 @product_api.route('/products/<int:product_id>', methods=['GET'])
 def get_product(product_id):
     from app import db, Product
-    product = db.session.get(Product, product_id)
-    if product is None:
-        return jsonify({"error": "Product not found."}), 404
-    return jsonify(product.to_dict())
+
+    def build():
+        product = db.session.get(Product, product_id)
+        if product is None:
+            return current_app.json.dumps({"error": "Product not found."}), 404
+        return current_app.json.dumps(product.to_dict()), 200, product.etag
+
+    return product_cache.json_response(build)
 
 # U: Update Product
 @product_api.route('/products/<int:product_id>', methods=['PUT'])
@@ -91,6 +226,12 @@ def update_product(product_id):
     data = request.get_json()
     validation_message, error_code = validate_product_input(data)
     if error_code: return jsonify({"error": validation_message}), error_code
+    try:
+        version = expected_version(request.if_match, data, product_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if version is not None and version != product.version:
+        raise PreconditionFailed(f"Product {product_id} is at version {product.version}, not {version}.")
     
     if 'name' in data: product.name = data['name']
     if 'description' in data: product.description = data['description']
@@ -99,7 +240,30 @@ def update_product(product_id):
     if 'is_available' in data: product.is_available = data['is_available']
     
     db.session.commit()
-    return jsonify(product.to_dict())
+    response = jsonify(product.to_dict())
+    response.set_etag(product.etag)
+    return response
+
+# U: Adjust Stock atomically (no read-modify-write)
+@product_api.route('/products/<int:product_id>/stock', methods=['POST'])
+def adjust_product_stock(product_id):
+    from app import db, Product
+    data = request.get_json(silent=True) or {}
+    delta = data.get('delta')
+    if not isinstance(delta, int) or isinstance(delta, bool):
+        return jsonify({"error": "delta must be an integer."}), 400
+
+    row = adjust_stock(db, Product, product_id, delta)
+    if row is None:
+        db.session.rollback()
+        # Only the failure path pays for a lookup, to tell the two cases apart
+        if db.session.get(Product, product_id) is None:
+            return jsonify({"error": "Product not found."}), 404
+        return jsonify({"error": "Insufficient stock for this adjustment."}), 409
+    db.session.commit()
+    response = jsonify(row_to_dict(row))
+    response.set_etag(f"product-{row.id}-v{row.version}")
+    return response
 
 # D: Delete Product
 @product_api.route('/products/<int:product_id>', methods=['DELETE'])
@@ -108,7 +272,98 @@ def delete_product(product_id):
     product = db.session.get(Product, product_id)
     if product is None:
         return jsonify({"error": "Product not found."}), 404
+    try:
+        version = expected_version(request.if_match, None, product_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if version is not None and version != product.version:
+        raise PreconditionFailed(f"Product {product_id} is at version {product.version}, not {version}.")
         
     db.session.delete(product)
     db.session.commit()
-    return jsonify({"message": f"Product {product_id} deleted."}), 204
\ No newline at end of file
+    return jsonify({"message": f"Product {product_id} deleted."}), 204
+
+# --- Bulk Routes (one transaction per request) ---
+def _bulk_chunk_size():
+    return current_app.config.get('BULK_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+
+# C: Bulk Create (or upsert items carrying an id with ?upsert=true; an existing
+# product keeps the fields an upserted item omits)
+@product_api.route('/products/bulk', methods=['POST'])
+def bulk_create_products():
+    from app import db, Product
+    items = request.get_json(silent=True)
+    upsert = request.args.get('upsert', '').lower() in ('true', '1')
+    errors = validate_items(items, validate_product_input, require_name=True)
+    if not errors and not upsert:
+        errors = [{"index": index, "error": "id is only accepted with upsert=true."}
+                  for index, data in enumerate(items) if 'id' in data]
+    if errors: return jsonify({"errors": errors}), 400
+
+    chunk_size = _bulk_chunk_size()
+    new_rows = [product_values(data) for data in items if 'id' not in data]
+    # Upserted items only overwrite the fields they carry (see bulk_upsert)
+    upsert_rows = [dict(product_values(data, partial=True), id=data['id']) for data in items if 'id' in data]
+    try:
+        # Explicit ids first (bulk_upsert moves the id sequence past them), so
+        # generated ids can never collide with an id named later in the batch
+        upserted_ids = iter(bulk_upsert(db, Product, upsert_rows, chunk_size) if upsert_rows else [])
+        inserted_ids = iter(bulk_insert(db, Product, new_rows, chunk_size))
+        ids = [next(upserted_ids) if 'id' in data else next(inserted_ids) for data in items]
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except Exception:
+        db.session.rollback()
+        raise
+    return jsonify({"ids": ids, "count": len(ids)}), 201
+
+# U: Bulk Update (partial, keyed by id)
+@product_api.route('/products/bulk', methods=['PATCH'])
+def bulk_update_products():
+    from app import db, Product
+    items = request.get_json(silent=True)
+    errors = validate_items(items, validate_product_input, require_id=True)
+    if errors: return jsonify({"errors": errors}), 400
+
+    chunk_size = _bulk_chunk_size()
+    versions = current_versions(db, Product, [data['id'] for data in items], chunk_size)
+    missing = [{"index": index, "error": f"Product {data['id']} not found."}
+               for index, data in enumerate(items) if data['id'] not in versions]
+    if missing: return jsonify({"errors": missing}), 404
+    stale = [{"index": index, "error": f"Product {data['id']} is at version {versions[data['id']]}, not {data['version']}."}
+             for index, data in enumerate(items)
+             if data.get('version') is not None and data['version'] != versions[data['id']]]
+    if stale: return jsonify({"errors": stale}), 412
+
+    rows = []
+    for data in items:
+        row = dict(product_values(data, partial=True), id=data['id'])
+        if data.get('version') is not None:
+            row['version'] = data['version']
+        rows.append(row)
+    try:
+        bulk_update(db, Product, [row for row in rows if set(row) - {'id', 'version'}], chunk_size)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return jsonify({"count": len(rows)})
+
+# D: Bulk Delete (JSON array of ids)
+@product_api.route('/products/bulk', methods=['DELETE'])
+def bulk_delete_products():
+    from app import db, Product
+    ids = request.get_json(silent=True)
+    if (not isinstance(ids, list) or not ids
+            or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids)):
+        return jsonify({"error": "Request body must be a non-empty JSON array of integer ids."}), 400
+
+    try:
+        deleted = bulk_delete(db, Product, list(dict.fromkeys(ids)), _bulk_chunk_size())
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return jsonify({"deleted": deleted})
@@ -0,0 +1,148 @@
+# profiling.py
+# WSGI middleware recording per-endpoint latency and response size, with
+# sampled cProfile captures written to PROFILE_DIR.
+#
+# The always-on path is two perf_counter() calls and a few dict updates per
+# request. cProfile only runs for sampled requests (PROFILE_SAMPLE_RATE) or
+# when the X-Profile header carries PROFILE_TOKEN, and at most one request is
+# profiled at a time per process.
+import cProfile
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+from flask import request
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+ENDPOINT_KEY = 'profiling.endpoint'
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+request_latency = registry.histogram(
+    'http_request_duration_seconds', 'Request latency including the streamed response body.')
+request_latency_quantiles = registry.summary(
+    'http_request_duration_quantiles_seconds', 'Latency quantiles over recent requests.')
+response_size = registry.histogram(
+    'http_response_size_bytes', 'Response body size.', SIZE_BUCKETS)
+profiles_written = registry.counter(
+    'http_request_profiles_total', 'Requests captured with cProfile.')
+
+
+class RequestProfiler:
+    """Installs the profiling middleware on a Flask app from its PROFILE_* settings."""
+
+    def __init__(self):
+        self.sample_rate = 0.0
+        self.token = None
+        self.directory = None
+        self._profile_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.sample_rate = app.config.get('PROFILE_SAMPLE_RATE', 0.0)
+        self.token = app.config.get('PROFILE_TOKEN')
+        self.directory = app.config.get('PROFILE_DIR') or os.path.join(app.instance_path, 'profiles')
+        app.before_request(self._tag_endpoint)
+        app.wsgi_app = ProfilingMiddleware(app.wsgi_app, self)
+
+    def _tag_endpoint(self):
+        # The WSGI layer cannot see Flask's URL rule, so leave the endpoint in the environ
+        request.environ[ENDPOINT_KEY] = request.endpoint or 'unmatched'
+
+    def should_profile(self, environ):
+        if self.token and environ.get(PROFILE_HEADER) == self.token:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start_profile(self, environ):
+        """Returns an enabled cProfile.Profile, or None if not sampled or one is already running."""
+        if not self.should_profile(environ) or not self._profile_lock.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler (e.g. a debugger) already owns the interpreter hook
+            self._profile_lock.release()
+            return None
+        return profile
+
+    def finish_profile(self, profile, environ, elapsed):
+        profile.disable()
+        self._profile_lock.release()
+        endpoint = re.sub(r'[^A-Za-z0-9_.-]', '_', environ.get(ENDPOINT_KEY, 'unmatched'))
+        filename = f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-{elapsed * 1000:.0f}ms-{os.getpid()}.prof"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            profile.dump_stats(os.path.join(self.directory, filename))
+            profiles_written.inc()
+        except OSError as e:
+            logger.warning("Could not write request profile %s: %s", filename, e)
+
+    def record(self, environ, status, size, elapsed):
+        endpoint = environ.get(ENDPOINT_KEY, 'unmatched')
+        method = environ.get('REQUEST_METHOD', '')
+        request_latency.observe(elapsed, endpoint=endpoint, method=method, status=status)
+        request_latency_quantiles.observe(elapsed, endpoint=endpoint, method=method)
+        response_size.observe(size, endpoint=endpoint, method=method)
+
+
+class ProfilingMiddleware:
+    """Times each request until its response body has been fully sent."""
+
+    def __init__(self, wsgi_app, profiler):
+        self.wsgi_app = wsgi_app
+        self.profiler = profiler
+
+    def __call__(self, environ, start_response):
+        start = time.perf_counter()
+        profile = self.profiler.start_profile(environ)
+        status = []
+
+        def recording_start_response(status_line, headers, exc_info=None):
+            status[:] = [status_line.split(' ', 1)[0]]
+            return start_response(status_line, headers, exc_info)
+
+        def finish(size):
+            elapsed = time.perf_counter() - start
+            if profile is not None:
+                self.profiler.finish_profile(profile, environ, elapsed)
+            self.profiler.record(environ, status[0] if status else '500', size, elapsed)
+
+        try:
+            body = self.wsgi_app(environ, recording_start_response)
+        except BaseException:
+            finish(0)
+            raise
+        return _MeasuredBody(body, finish)
+
+
+class _MeasuredBody:
+    """Wraps a WSGI response iterable, counting bytes and calling 'on_close' once."""
+
+    def __init__(self, body, on_close):
+        self._body = body
+        self._on_close = on_close
+        self._size = 0
+
+    def __iter__(self):
+        for chunk in self._body:
+            self._size += len(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self._body, 'close'):
+                self._body.close()
+        finally:
+            on_close, self._on_close = self._on_close, None
+            if on_close is not None:
+                on_close(self._size)
+
+
+request_profiler = RequestProfiler()
@@ -0,0 +1,122 @@
+# search.py
+# Ranked product search over name/description with keyset pagination.
+#
+# On PostgreSQL, search uses a generated tsvector column with a GIN index for
+# full-text matches and a pg_trgm GIN index on name for prefix and typo-tolerant
+# matches. Other databases (SQLite in development and benchmarks) use a
+# portable LIKE-based engine with the same interface.
+from sqlalchemy import DDL, Double, and_, case, cast, event, func, literal, literal_column, or_
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+from pagination import escape_like, encode_cursor
+from serialization import product_columns
+
+TEXT_SEARCH_CONFIG = 'simple'
+
+# Idempotent, so it can run from the after_create hook or against an existing table.
+POSTGRES_SEARCH_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    "GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('" + TEXT_SEARCH_CONFIG + "', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('" + TEXT_SEARCH_CONFIG + "', coalesce(description, '')), 'B')"
+    ") STORED",
+    "CREATE INDEX IF NOT EXISTS ix_{table}_search_vector ON {table} USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_{table}_name_trgm ON {table} USING gin (name gin_trgm_ops)",
+)
+
+
+def register_search_ddl(table):
+    """Adds the PostgreSQL search column and indexes whenever 'table' is created."""
+    for statement in POSTGRES_SEARCH_DDL:
+        event.listen(table, 'after_create',
+                     DDL(statement.format(table=table.name)).execute_if(dialect='postgresql'))
+
+
+def install_search(db, table):
+    """Adds the search column and indexes to an existing PostgreSQL table."""
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return False
+    for statement in POSTGRES_SEARCH_DDL:
+        db.session.execute(db.text(statement.format(table=table.name)))
+    db.session.commit()
+    return True
+
+
+# --- Search Engines ---
+class PostgresSearchEngine:
+    """Full-text (tsvector @@ tsquery) plus trigram matching, ranked by ts_rank_cd + similarity."""
+
+    def __init__(self, Product):
+        self.Product = Product
+        self.search_vector = literal_column(f"{Product.__table__.name}.search_vector", type_=TSVECTOR)
+
+    def match(self, term):
+        tsquery = func.websearch_to_tsquery(TEXT_SEARCH_CONFIG, term)
+        return or_(
+            self.search_vector.bool_op('@@')(tsquery),
+            self.Product.name.bool_op('%')(term),
+            self.Product.name.ilike(escape_like(term) + '%', escape='\\'),
+        )
+
+    def rank(self, term):
+        tsquery = func.websearch_to_tsquery(TEXT_SEARCH_CONFIG, term)
+        # Both functions return real (float4); as float8 the rank handed out in a
+        # cursor compares equal to itself on the next page, so ties are not lost
+        return cast(func.ts_rank_cd(self.search_vector, tsquery) + func.similarity(self.Product.name, term),
+                    Double)
+
+
+class FallbackSearchEngine:
+    """Portable LIKE matching: every word must appear in name or description."""
+
+    def __init__(self, Product):
+        self.Product = Product
+
+    def match(self, term):
+        clauses = []
+        for word in term.split():
+            pattern = f"%{escape_like(word)}%"
+            clauses.append(or_(self.Product.name.ilike(pattern, escape='\\'),
+                               self.Product.description.ilike(pattern, escape='\\')))
+        return and_(*clauses)
+
+    def rank(self, term):
+        escaped = escape_like(term)
+        name = func.lower(self.Product.name)
+        return case(
+            (name == term.lower(), literal(4.0)),
+            (name.like(escaped.lower() + '%', escape='\\'), literal(3.0)),
+            (name.like('%' + escaped.lower() + '%', escape='\\'), literal(2.0)),
+            else_=literal(1.0),
+        )
+
+
+def search_engine(db, Product):
+    """Picks the search engine for the bound database."""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return PostgresSearchEngine(Product)
+    return FallbackSearchEngine(Product)
+
+
+def search_products(db, Product, term, limit, after=None, filters=()):
+    """
+    Returns (rows, next_cursor) where each row holds the product columns plus
+    'rank', ordered by rank (best first) then id. 'after' is a decoded
+    ('rank', desc) cursor.
+    """
+    engine = search_engine(db, Product)
+    rank = engine.rank(term)
+    statement = db.select(*product_columns(Product), rank.label('rank')).where(engine.match(term), *filters)
+    if after is not None:
+        last_rank, last_id = after
+        statement = statement.where(or_(rank < last_rank, and_(rank == last_rank, Product.id > last_id)))
+    statement = statement.order_by(rank.desc(), Product.id.asc()).limit(limit + 1)
+
+    rows = db.session.execute(statement).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor('rank', True, last.rank, last.id)
+    return rows, next_cursor
@@ -0,0 +1,80 @@
+# serialization.py
+# Fast JSON encoding for API responses.
+#
+# FastJSONProvider replaces Flask's default provider: it uses orjson when it
+# is installed and falls back to the standard library otherwise. Product
+# listings are built from column tuples (product_columns + row_to_dict)
+# instead of ORM instances, skipping identity-map and attribute overhead.
+import json
+from datetime import date, datetime
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional dependency; the stdlib encoder is used instead
+    orjson = None
+
+# Same fields, in the same order, as Product.to_dict()
+PRODUCT_COLUMNS = ('id', 'name', 'description', 'price', 'stock_quantity', 'is_available', 'created_at', 'version')
+
+
+def product_columns(Product):
+    """Returns the mapped columns to SELECT for a product row."""
+    return [getattr(Product, name) for name in PRODUCT_COLUMNS]
+
+
+def row_to_dict(row):
+    """Formats a column row exactly like Product.to_dict() does for a model instance."""
+    return {
+        'id': row.id,
+        'name': row.name,
+        'description': row.description,
+        'price': f"{row.price:.2f}",
+        'stock_quantity': row.stock_quantity,
+        'is_available': row.is_available,
+        'created_at': row.created_at.isoformat(),
+        'version': row.version
+    }
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider backed by orjson when available. Keys are not sorted, and
+    dates/datetimes are always encoded as ISO 8601 by both backends.
+    """
+    sort_keys = False
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, (datetime, date)):
+            return o.isoformat()
+        return DefaultJSONProvider.default(o)
+
+    def _orjson_options(self):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.dumps(obj, default=self.default, option=self._orjson_options()).decode('utf-8')
+        kwargs.setdefault('default', self.default)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        kwargs.setdefault('separators', (',', ':'))
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if orjson is not None and not (self.compact is None and self._app.debug):
+            # Hand orjson's bytes straight to the response, skipping a decode/encode
+            body = orjson.dumps(obj, default=self.default, option=self._orjson_options())
+            return self._app.response_class(body, mimetype=self.mimetype)
+        return super().response(*args, **kwargs)
@@ -0,0 +1,197 @@
+# stats.py
+# Precomputed inventory totals for /api/products/stats.
+#
+# product_stats holds running totals (product count, available count, total
+# stock and stock value = price x stock_quantity) that database triggers on
+# product keep up to date inside the writing transaction, so every write path
+# (API, forms, bulk endpoints, jobs, COPY imports) is covered and reads sum a
+# handful of rows instead of scanning the catalog.
+#
+# On PostgreSQL the triggers are statement-level with transition tables (one
+# summary update per statement, however many rows it touched) and spread their
+# deltas over STATS_SLOTS rows by backend pid, so concurrent writers do not
+# queue on a single hot row. SQLite uses row-level triggers on one slot.
+#
+# The same triggers bump a change counter ('version') and 'modified_at', so
+# catalog_version() is a database-wide catalog version that every process
+# (web workers, job workers, CLI imports, manual SQL) sees; cache.py derives
+# cache keys and ETags from it.
+from sqlalchemy import DDL, event, func
+
+STATS_SLOTS = 16
+DEFAULT_LOW_STOCK_THRESHOLD = 5
+DEFAULT_LOW_STOCK_LIMIT = 20
+MAX_LOW_STOCK_LIMIT = 100
+
+# Epoch seconds, for modified_at
+_POSTGRES_NOW = "extract(epoch FROM clock_timestamp())"
+_SQLITE_NOW = "(julianday('now') - 2440587.5) * 86400.0"
+
+_POSTGRES_APPLY = (
+    "INSERT INTO {stats} AS s (slot, product_count, available_count, total_stock, stock_value, version, modified_at) "
+    "SELECT pg_backend_pid() % " + str(STATS_SLOTS) + ", {sign} count(*), {sign} count(*) FILTER (WHERE r.is_available), "
+    "{sign} coalesce(sum(r.stock_quantity), 0), "
+    "{sign} coalesce(sum(round((coalesce(r.price, 0) * coalesce(r.stock_quantity, 0))::numeric, 4)), 0), "
+    "{bump}, " + _POSTGRES_NOW + " "
+    "FROM {rows} r "
+    "ON CONFLICT (slot) DO UPDATE SET "
+    "product_count = s.product_count + EXCLUDED.product_count, "
+    "available_count = s.available_count + EXCLUDED.available_count, "
+    "total_stock = s.total_stock + EXCLUDED.total_stock, "
+    "stock_value = s.stock_value + EXCLUDED.stock_value, "
+    "version = s.version + EXCLUDED.version, "
+    "modified_at = EXCLUDED.modified_at;"
+)
+
+# Idempotent, so it can run on every create_all
+POSTGRES_STATS_DDL = (
+    "CREATE OR REPLACE FUNCTION {stats}_apply() RETURNS trigger LANGUAGE plpgsql AS $$ "
+    "BEGIN "
+    "IF TG_OP IN ('INSERT', 'UPDATE') THEN "
+    + _POSTGRES_APPLY.format(stats='{stats}', sign='', rows='new_rows', bump='1') + " END IF; "
+    "IF TG_OP IN ('UPDATE', 'DELETE') THEN "
+    # An UPDATE already bumped the version with its new rows
+    + _POSTGRES_APPLY.format(stats='{stats}', sign='-', rows='old_rows',
+                             bump="(CASE WHEN TG_OP = 'DELETE' THEN 1 ELSE 0 END)") + " END IF; "
+    "RETURN NULL; "
+    "END $$",
+    "DROP TRIGGER IF EXISTS {stats}_insert ON {table}",
+    "CREATE TRIGGER {stats}_insert AFTER INSERT ON {table} "
+    "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION {stats}_apply()",
+    "DROP TRIGGER IF EXISTS {stats}_update ON {table}",
+    "CREATE TRIGGER {stats}_update AFTER UPDATE ON {table} "
+    "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION {stats}_apply()",
+    "DROP TRIGGER IF EXISTS {stats}_delete ON {table}",
+    "CREATE TRIGGER {stats}_delete AFTER DELETE ON {table} "
+    "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION {stats}_apply()",
+)
+
+_SQLITE_DELTA = (
+    "UPDATE {stats} SET "
+    "product_count = product_count {sign} 1, "
+    "available_count = available_count {sign} (CASE WHEN {row}.is_available THEN 1 ELSE 0 END), "
+    "total_stock = total_stock {sign} coalesce({row}.stock_quantity, 0), "
+    "stock_value = stock_value {sign} round(coalesce({row}.price, 0) * coalesce({row}.stock_quantity, 0), 4) "
+    "WHERE slot = 0;"
+)
+
+_SQLITE_BUMP = (
+    "UPDATE {stats} SET version = version + 1, modified_at = " + _SQLITE_NOW + " WHERE slot = 0;"
+)
+
+SQLITE_STATS_DDL = (
+    "CREATE TRIGGER IF NOT EXISTS {stats}_insert AFTER INSERT ON {table} BEGIN "
+    + _SQLITE_DELTA.format(stats='{stats}', sign='+', row='NEW') + " END",
+    "CREATE TRIGGER IF NOT EXISTS {stats}_update AFTER UPDATE OF price, stock_quantity, is_available ON {table} BEGIN "
+    + _SQLITE_DELTA.format(stats='{stats}', sign='-', row='OLD') + " "
+    + _SQLITE_DELTA.format(stats='{stats}', sign='+', row='NEW') + " END",
+    "CREATE TRIGGER IF NOT EXISTS {stats}_delete AFTER DELETE ON {table} BEGIN "
+    + _SQLITE_DELTA.format(stats='{stats}', sign='-', row='OLD') + " END",
+    # Separate triggers: the version changes on every write, including name/description edits
+    "CREATE TRIGGER IF NOT EXISTS {stats}_version_insert AFTER INSERT ON {table} BEGIN " + _SQLITE_BUMP + " END",
+    "CREATE TRIGGER IF NOT EXISTS {stats}_version_update AFTER UPDATE ON {table} BEGIN " + _SQLITE_BUMP + " END",
+    "CREATE TRIGGER IF NOT EXISTS {stats}_version_delete AFTER DELETE ON {table} BEGIN " + _SQLITE_BUMP + " END",
+)
+
+# Seeds slot 0 from the current catalog the first time the triggers are installed
+_SEED = (
+    "INSERT INTO {stats} (slot, product_count, available_count, total_stock, stock_value, version, modified_at) "
+    "SELECT 0, n, available, stock, value, 1, {now} FROM ("
+    "SELECT count(*) AS n, coalesce(sum(CASE WHEN is_available THEN 1 ELSE 0 END), 0) AS available, "
+    "coalesce(sum(stock_quantity), 0) AS stock, coalesce(sum(round({value}, 4)), 0) AS value "
+    "FROM {table}) totals "
+    # Filtered outside the aggregate, which always yields one row
+    "WHERE NOT EXISTS (SELECT 1 FROM {stats})"
+)
+_POSTGRES_VALUE = "(coalesce(price, 0) * coalesce(stock_quantity, 0))::numeric"
+_SQLITE_VALUE = "coalesce(price, 0) * coalesce(stock_quantity, 0)"
+
+
+def _statements(dialect, stats_table, product_table):
+    names = {'stats': stats_table.name, 'table': product_table.name}
+    if dialect == 'postgresql':
+        ddl, value, now = POSTGRES_STATS_DDL, _POSTGRES_VALUE, _POSTGRES_NOW
+    elif dialect == 'sqlite':
+        ddl, value, now = SQLITE_STATS_DDL, _SQLITE_VALUE, _SQLITE_NOW
+    else:
+        return ()
+    return [statement.format(**names) for statement in ddl] + [_SEED.format(value=value, now=now, **names)]
+
+
+def register_stats_ddl(metadata, stats_table, product_table):
+    """Installs the triggers and seeds the totals after every create_all on 'metadata'."""
+    for dialect in ('postgresql', 'sqlite'):
+        for statement in _statements(dialect, stats_table, product_table):
+            # Escape '%' (the PostgreSQL modulo) from DDL's own string formatting
+            event.listen(metadata, 'after_create',
+                         DDL(statement.replace('%', '%%')).execute_if(dialect=dialect))
+
+
+def install_stats_ddl(db, stats_table, product_table):
+    """
+    (Re)installs the triggers on an existing database, as create_all does.
+    Returns False if the database is not supported.
+    """
+    statements = _statements(db.session.get_bind().dialect.name, stats_table, product_table)
+    for statement in statements:
+        db.session.execute(db.text(statement))
+    db.session.commit()
+    return bool(statements)
+
+
+def refresh_stats(db, stats_table, product_table):
+    """
+    Recomputes the totals from scratch (after manual SQL that bypassed the
+    triggers, e.g. TRUNCATE). Writers are blocked while it runs on PostgreSQL.
+    """
+    dialect = db.session.get_bind().dialect.name
+    statements = _statements(dialect, stats_table, product_table)
+    if not statements:
+        raise ValueError(f"Inventory stats are not supported on the '{dialect}' database.")
+    if dialect == 'postgresql':
+        db.session.execute(db.text(f"LOCK TABLE {product_table.name} IN SHARE MODE"))
+    # The manual SQL may have changed the catalog too, so the version moves on, never back
+    version = db.session.execute(db.text(f"SELECT coalesce(sum(version), 0) FROM {stats_table.name}")).scalar()
+    db.session.execute(db.text(f"DELETE FROM {stats_table.name}"))
+    for statement in statements:
+        db.session.execute(db.text(statement))
+    db.session.execute(db.text(f"UPDATE {stats_table.name} SET version = :version WHERE slot = 0"),
+                       {'version': int(version) + 1})
+    db.session.commit()
+
+
+def catalog_version(db, ProductStats):
+    """
+    Returns (version, modified_at) for the whole catalog: a counter bumped by
+    every write to product and the epoch time of the latest write. None on a
+    database without the triggers, where changes cannot be tracked.
+    """
+    if db.session.get_bind().dialect.name not in ('postgresql', 'sqlite'):
+        return None
+    row = db.session.execute(db.select(
+        func.coalesce(func.sum(ProductStats.version), 0), func.max(ProductStats.modified_at))).one()
+    return int(row[0]), row[1] or 0.0
+
+
+def inventory_totals(db, ProductStats):
+    """Returns the running totals by summing the (at most STATS_SLOTS) summary rows."""
+    row = db.session.execute(db.select(
+        func.coalesce(func.sum(ProductStats.product_count), 0).label('product_count'),
+        func.coalesce(func.sum(ProductStats.available_count), 0).label('available_count'),
+        func.coalesce(func.sum(ProductStats.total_stock), 0).label('total_stock'),
+        func.coalesce(func.sum(ProductStats.stock_value), 0).label('stock_value'),
+    )).one()
+    return {
+        'product_count': int(row.product_count),
+        'available_count': int(row.available_count),
+        'unavailable_count': int(row.product_count) - int(row.available_count),
+        'total_stock': int(row.total_stock),
+        'stock_value': f"{float(row.stock_value):.2f}",
+    }
+
+
+def low_stock(db, Product, columns, threshold, limit):
+    """Products with stock_quantity <= threshold, lowest first (an ix_product_stock_quantity_id range scan)."""
+    return db.session.execute(
+        db.select(*columns).where(Product.stock_quantity <= threshold)
+        .order_by(Product.stock_quantity, Product.id).limit(limit)).all()